@@ -0,0 +1,116 @@
+"""Offline benchmark suite: python -m bench [--cases checks,live_index] [--compare previous.json]
+
+Results go to bench/results/<timestamp>.json. Mongo cases need the stand-in from bench/docker-compose.yml.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any
+
+from pymongo.errors import PyMongoError
+
+from bench.cases import CASES, BenchConfig
+from bench.fakes import UpstreamBehavior
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def parse_args() -> argparse.Namespace:
+    defaults = BenchConfig()
+    parser = argparse.ArgumentParser(prog="python -m bench", description="mm-proxy benchmarks")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma separated: {', '.join(CASES)}")
+    parser.add_argument("--size", type=int, default=defaults.size, help="proxies in the dataset, 10k-1M")
+    parser.add_argument("--sources", type=int, default=defaults.sources)
+    parser.add_argument("--duration", type=float, default=defaults.duration, help="seconds per timed case")
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--upstreams", type=int, default=defaults.upstreams, help="fake proxy servers")
+    parser.add_argument("--latency-ms", type=float, default=defaults.behavior.latency_ms)
+    parser.add_argument("--failure-rate", type=float, default=defaults.behavior.failure_rate)
+    parser.add_argument("--blackhole-rate", type=float, default=defaults.behavior.blackhole_rate)
+    parser.add_argument("--mongo-url", default=defaults.mongo_url)
+    parser.add_argument("--live-url", help="base url of a running instance for the live_http case")
+    parser.add_argument("--access-token")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--out", type=Path, help="result file, default bench/results/<timestamp>.json")
+    parser.add_argument("--compare", type=Path, help="previous result file to compare with")
+    return parser.parse_args()
+
+
+def git_revision() -> str | None:
+    try:
+        res = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)  # noqa: S607
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return res.stdout.strip()
+
+
+async def run(cfg: BenchConfig, cases: list[str]) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for name in cases:
+        print(f"{name}...", file=sys.stderr, flush=True)  # noqa: T201
+        started_at = time.monotonic()
+        try:
+            results[name] = await CASES[name](cfg)
+        except (OSError, PyMongoError) as e:
+            results[name] = {"error": str(e)}
+        results[name]["case_seconds"] = round(time.monotonic() - started_at, 1)
+    return results
+
+
+def compare(previous: dict[str, Any], current: dict[str, Any]) -> None:
+    for case, metrics in current["results"].items():
+        old = previous.get("results", {}).get(case, {})
+        for key, value in metrics.items():
+            before = old.get(key)
+            if isinstance(value, (int, float)) and isinstance(before, (int, float)) and before:
+                change = (value - before) / before * 100
+                print(f"{case}.{key:<40} {before:>12} -> {value:>12}  {change:+.1f}%")  # noqa: T201
+
+
+def main() -> None:
+    args = parse_args()
+    cfg = BenchConfig(
+        size=args.size,
+        sources=args.sources,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        upstreams=args.upstreams,
+        behavior=UpstreamBehavior(args.latency_ms, args.failure_rate, args.blackhole_rate),
+        mongo_url=args.mongo_url,
+        live_url=args.live_url,
+        access_token=args.access_token,
+        seed=args.seed,
+    )
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        sys.exit(f"unknown cases: {', '.join(unknown)}")
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": asdict(cfg) | {"access_token": None},
+        },
+        "results": asyncio.run(run(cfg, cases)),
+    }
+    out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(json.dumps(report["results"], indent=2))  # noqa: T201
+    print(f"saved: {out}", file=sys.stderr)  # noqa: T201
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Benchmark cases. Each one returns a flat dict of numbers, so results of two runs can be compared key by key."""
+
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import timedelta
+from types import SimpleNamespace
+from typing import Any
+
+import aiohttp
+from mm_mongo import AsyncMongoCollection
+from mm_std import utc_now
+from pymongo import AsyncMongoClient
+from pymongo.asynchronous.database import AsyncDatabase
+
+from app.core.checker import CheckPool
+from app.core.db import Protocol, Proxy, Source
+from app.core.echo import EchoChecker
+from app.core.live import LiveIndex, LiveQuery, LiveSort
+from app.core.metrics import RateCounter
+from app.core.probe import ProbeResult, probe_proxy
+from app.core.rotation import RotationStrategy, Rotator
+from app.core.services.source import INSERT_CHUNK_SIZE, SourceService, stats_pipeline
+from app.core.snapshot import LiveSnapshotCache
+from app.core.tombstone import TombstoneStore
+from bench import datasets
+from bench.fakes import EchoServer, FakeProxyServer, ListServer, UpstreamBehavior
+
+
+@dataclass
+class BenchConfig:
+    size: int = 10_000  # proxies in the dataset
+    sources: int = 50
+    duration: float = 20  # seconds per timed case
+    concurrency: int = 200
+    upstreams: int = 4  # fake proxy servers
+    behavior: UpstreamBehavior = field(default_factory=UpstreamBehavior)
+    precheck_timeout: float = 1.5
+    check_timeout: float = 5.1
+    mongo_url: str = "mongodb://localhost:27117"
+    live_url: str | None = None  # a running instance, for the HTTP /api/proxies/live case
+    access_token: str | None = None
+    seed: int = 0
+
+
+def percentiles(samples: list[float], prefix: str) -> dict[str, float]:
+    if not samples:
+        return {}
+    q = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else [samples[0]] * 99
+    return {f"{prefix}_p50": round(q[49], 3), f"{prefix}_p90": round(q[89], 3), f"{prefix}_p99": round(q[98], 3)}
+
+
+async def bench_checks(cfg: BenchConfig) -> dict[str, Any]:
+    """The check pipeline (pool, TCP/handshake pre-check, hedged IP-echo) against local fake upstreams."""
+    echo_server = EchoServer()
+    await echo_server.start()
+    servers = [FakeProxyServer(cfg.behavior, seed=cfg.seed + i) for i in range(cfg.upstreams)]
+    ports = [await s.start() for s in servers]
+    proxies = datasets.make_proxies(datasets.make_urls(cfg.size, ports, cfg.seed), cfg.sources)
+
+    echo = EchoChecker()
+    echo.configure(echo_server.url, 0.9)
+    latencies: list[float] = []
+    outcomes: Counter[str] = Counter()
+    due = itertools.cycle(proxies)
+
+    async def claim(limit: int) -> list[Proxy]:
+        return list(itertools.islice(due, limit))
+
+    async def check(proxy: Proxy) -> None:
+        started_at = time.monotonic()
+        probe = await probe_proxy(proxy.url, echo.target(), cfg.precheck_timeout)
+        ip = await echo.get_ip(proxy.url, cfg.check_timeout) if probe == ProbeResult.OK else None
+        latencies.append((time.monotonic() - started_at) * 1000)
+        outcomes["ok" if ip else ("no_ip" if probe == ProbeResult.OK else probe.lower())] += 1
+
+    counter = RateCounter(window_seconds=max(int(cfg.duration) + 1, 60))
+    pool = CheckPool(claim, check, counter)
+    started_at = time.monotonic()
+    await pool.start(cfg.concurrency)
+    await asyncio.sleep(cfg.duration)
+    await pool.stop()
+    elapsed = time.monotonic() - started_at
+    for s in servers:
+        await s.stop()
+    await echo_server.stop()
+
+    total = sum(outcomes.values())
+    return {
+        "checks": total,
+        "checks_per_minute": round(total / elapsed * 60),
+        **percentiles(latencies, "latency_ms"),
+        **{f"outcome_{k}": v for k, v in sorted(outcomes.items())},
+    }
+
+
+async def bench_live_index(cfg: BenchConfig) -> dict[str, Any]:
+    """What /api/proxies/live and /api/proxies/next do per request: index query, serialization, rotation."""
+    index = LiveIndex()
+    started_at = time.monotonic()
+    index.rebuild(datasets.make_live_proxies(cfg.size, cfg.sources, cfg.seed))
+    res: dict[str, Any] = {"rebuild_ms": round((time.monotonic() - started_at) * 1000, 1)}
+    cutoff = utc_now() - timedelta(minutes=15)
+    queries = {
+        "all": LiveQuery(),
+        "sources": LiveQuery(sources=("source1", "source2", "source3")),
+        "unique_ip": LiveQuery(unique_ip=True),
+        "fastest100": LiveQuery(sort=LiveSort.LATENCY, limit=100),
+    }
+    per_case = cfg.duration / (len(queries) + 1)
+    for name, q in queries.items():
+
+        def run(q: LiveQuery = q) -> None:
+            json.dumps({"proxies": [p.url for p in index.query(cutoff, q)]})
+
+        res |= timed_loop(f"live_{name}", run, per_case)
+
+    snapshots = LiveSnapshotCache()
+
+    def run_cached(q: LiveQuery = queries["all"]) -> None:
+        snapshots.get(q, "json", index.version, lambda: [p.url for p in index.query(cutoff, q)]).encode("gzip")
+
+    res |= timed_loop("live_all_cached", run_cached, per_case / 2)
+
+    rotator = Rotator(index)
+    for strategy in RotationStrategy:
+
+        def run_next(strategy: RotationStrategy = strategy) -> None:
+            rotator.next(cutoff, strategy, 1, key="session")
+
+        res |= timed_loop(f"next_{strategy}", run_next, per_case / len(RotationStrategy))
+    return res
+
+
+def timed_loop(name: str, func: Callable[[], None], duration: float) -> dict[str, Any]:
+    samples: list[float] = []
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started_at = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return {f"{name}_qps": round(len(samples) / duration), **percentiles(samples, f"{name}_ms")}
+
+
+async def bench_live_http(cfg: BenchConfig) -> dict[str, Any]:
+    """/api/proxies/live of a running instance, concurrent keep-alive clients."""
+    if not cfg.live_url:
+        return {"skipped": 1}
+    headers = {"access-token": cfg.access_token} if cfg.access_token else {}
+    samples: list[float] = []
+    errors = 0
+    deadline = time.monotonic() + cfg.duration
+
+    async def client(session: aiohttp.ClientSession) -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started_at = time.perf_counter()
+            async with session.get(f"{cfg.live_url}/api/proxies/live", headers=headers) as resp:
+                await resp.read()
+                if resp.status != 200:
+                    errors += 1
+            samples.append((time.perf_counter() - started_at) * 1000)
+
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(client(session) for _ in range(min(cfg.concurrency, 50))))
+    return {"qps": round(len(samples) / cfg.duration), "errors": errors, **percentiles(samples, "latency_ms")}
+
+
+async def bench_stats(cfg: BenchConfig) -> dict[str, Any]:
+    """The calc_stats aggregation over a generated proxy collection."""
+    async with MongoStandIn(cfg) as db:
+        docs = datasets.make_proxy_documents(cfg.size, cfg.sources, cfg.seed)
+        for i in range(0, len(docs), INSERT_CHUNK_SIZE):
+            await db.proxy.insert_many(docs[i : i + INSERT_CHUNK_SIZE], ordered=False)
+        pipeline = stats_pipeline(utc_now() - timedelta(minutes=15))
+        samples: list[float] = []
+        deadline = time.monotonic() + cfg.duration
+        while time.monotonic() < deadline or len(samples) < 3:
+            started_at = time.perf_counter()
+            cursor = await db.proxy.aggregate(pipeline, allowDiskUse=True)
+            await cursor.to_list()
+            samples.append((time.perf_counter() - started_at) * 1000)
+        return {"runs": len(samples), **percentiles(samples, "stats_ms")}
+
+
+async def bench_ingest(cfg: BenchConfig) -> dict[str, Any]:
+    """Source ingestion through SourceService.check, the list served by a local HTTP server: the first check inserts
+    everything, a full ingest of the same list finds it all stored, and the next check stops at the content hash."""
+    list_server = ListServer(datasets.make_source_list(cfg.size, cfg.seed))
+    await list_server.start()
+    res: dict[str, Any] = {"lines": cfg.size}
+    async with MongoStandIn(cfg) as database:
+        db = SimpleNamespace(
+            source=await AsyncMongoCollection.init(database, Source), proxy=await AsyncMongoCollection.init(database, Proxy)
+        )
+        service = SourceService()
+        service.core = SimpleNamespace(
+            db=db, services=SimpleNamespace(proxy=SimpleNamespace(tombstones=TombstoneStore(), live=LiveIndex()))
+        )
+        default = Source.Default(protocol=Protocol.HTTP, username="u", password="p", port=8080)  # noqa: S106
+        await db.source.insert_one(Source(id="bench", link=list_server.url, default=default))
+        for attempt in ("first", "repeat", "unchanged"):
+            if attempt == "repeat":
+                await db.source.set("bench", {"full_ingest_at": None})  # diffed again, although the content is the same
+            started_at = time.perf_counter()
+            report = await service.check("bench")
+            seconds = time.perf_counter() - started_at
+            res |= {
+                f"ingest_{attempt}_lines_per_second": round(cfg.size / seconds),
+                f"ingest_{attempt}_added": report.added,
+                f"ingest_{attempt}_unchanged": report.unchanged,
+            }
+    await list_server.stop()
+    return res
+
+
+class MongoStandIn:
+    """A throwaway database on the local Mongo stand-in (bench/docker-compose.yml), dropped afterwards."""
+
+    def __init__(self, cfg: BenchConfig) -> None:
+        self.client: AsyncMongoClient[dict[str, Any]] = AsyncMongoClient(cfg.mongo_url, serverSelectionTimeoutMS=3000)
+        self.name = f"bench_{int(time.time())}"
+
+    async def __aenter__(self) -> AsyncDatabase[dict[str, Any]]:
+        await self.client.admin.command("ping")
+        return self.client[self.name]
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.client.drop_database(self.name)
+        await self.client.close()
+
+
+CASES = {
+    "checks": bench_checks,
+    "live_index": bench_live_index,
+    "live_http": bench_live_http,
+    "stats": bench_stats,
+    "ingest": bench_ingest,
+}
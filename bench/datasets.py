@@ -0,0 +1,90 @@
+"""Generated, seeded datasets: proxy urls spread over many sources, Mongo documents and source lists."""
+
+import random
+from datetime import timedelta
+from typing import Any
+
+from mm_std import utc_now
+
+from app.core.db import Protocol, Proxy, Status
+from app.core.live import LiveProxy
+
+
+def make_urls(size: int, ports: list[int], seed: int = 0) -> list[str]:
+    """Unique proxy urls on the local fake servers, told apart by their credentials."""
+    rnd = random.Random(seed)
+    urls = []
+    for i in range(size):
+        scheme = "socks5" if rnd.random() < 0.5 else "http"
+        urls.append(f"{scheme}://u{i}:p{i}@127.0.0.1:{rnd.choice(ports)}")
+    return urls
+
+
+def make_proxies(urls: list[str], sources: int) -> list[Proxy]:
+    return [Proxy.new(f"source{i % sources}", url) for i, url in enumerate(urls)]
+
+
+def make_live_proxies(size: int, sources: int, seed: int = 0) -> list[LiveProxy]:
+    """Live index entries with public-looking ips; about a third of the ips are shared by several proxies."""
+    rnd = random.Random(seed)
+    now = utc_now()
+    res = []
+    for i in range(size):
+        protocol = Protocol.SOCKS5 if rnd.random() < 0.5 else Protocol.HTTP
+        ip_n = rnd.randrange(size * 2 // 3 or 1)
+        res.append(
+            LiveProxy(
+                url=f"{protocol}://u:p@10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{1000 + i % 5000}",
+                source=f"source{rnd.randrange(sources)}",
+                protocol=protocol,
+                proxy_ip=f"198.{ip_n >> 16 & 255}.{ip_n >> 8 & 255}.{ip_n & 255}",
+                last_ok_at=now - timedelta(seconds=rnd.randrange(600)),
+                latency_ms=round(rnd.lognormvariate(5, 0.8), 1),
+                success_rate=rnd.random(),
+            )
+        )
+    return res
+
+
+def make_proxy_documents(size: int, sources: int, seed: int = 0) -> list[dict[str, Any]]:
+    """Checked proxies as stored in Mongo, with a realistic status mix: most are down."""
+    rnd = random.Random(seed)
+    now = utc_now()
+    docs = []
+    for live in make_live_proxies(size, sources, seed):
+        proxy = Proxy.new(live.source, live.url)
+        roll = rnd.random()
+        if roll < 0.2:
+            proxy.status, proxy.proxy_ip, proxy.last_ok_at = Status.OK, live.proxy_ip, live.last_ok_at
+        elif roll < 0.3:
+            last_ok_at = now - timedelta(hours=rnd.randrange(1, 48))
+            proxy.status, proxy.proxy_ip, proxy.last_ok_at = Status.DOWN, live.proxy_ip, last_ok_at
+        else:
+            proxy.status = Status.DOWN
+        proxy.checked_at = now - timedelta(seconds=rnd.randrange(3600))
+        proxy.next_check_at = now + timedelta(seconds=rnd.randrange(-600, 3600))
+        docs.append(to_document(proxy))
+    return docs
+
+
+def make_source_list(size: int, seed: int = 0) -> str:
+    """A source list body: mostly full urls, some ip:port lines, duplicates, comments and garbage."""
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(size):
+        roll = rnd.random()
+        if roll < 0.7:
+            lines.append(f"socks5://u{i}:p@10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:1080")
+        elif roll < 0.9:
+            lines.append(f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}:{8000 + i % 1000}")
+        elif roll < 0.95 and lines:
+            lines.append(rnd.choice(lines))
+        else:
+            lines.append(rnd.choice(["# comment", "", "not a proxy", "1.2.3:80"]))
+    return "\n".join(lines)
+
+
+def to_document(proxy: Proxy) -> dict[str, Any]:
+    doc = proxy.model_dump()
+    doc["_id"] = doc.pop("id")
+    return doc
@@ -0,0 +1,174 @@
+"""Local stand-ins for the network: upstream proxies with configurable behavior, an IP-echo server and a source list."""
+
+import asyncio
+import contextlib
+import json
+import random
+import struct
+from dataclasses import dataclass
+
+from app.core.gateway import read_socks5_address, relay
+
+ECHO_IP = "203.0.113.7"  # TEST-NET-3, never equal to the own ip
+
+
+@dataclass
+class UpstreamBehavior:
+    latency_ms: float = 50  # added before the handshake answer
+    failure_rate: float = 0.3  # share of connections closed right away
+    blackhole_rate: float = 0.1  # share of connections which never answer
+
+
+class FakeProxyServer:
+    """HTTP (CONNECT and absolute-url requests) and SOCKS5 proxy on one port, the protocol is told by the first byte.
+
+    Every connection independently fails, blackholes or works with the configured rates, so a dataset
+    of many urls (different credentials) on one server behaves like a realistic mix of dead and live proxies.
+    """
+
+    def __init__(self, behavior: UpstreamBehavior, seed: int = 0) -> None:
+        self.behavior = behavior
+        self.random = random.Random(seed)
+        self.server: asyncio.Server | None = None
+        self.port = 0
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            roll = self.random.random()
+            if roll < self.behavior.failure_rate:
+                return
+            if roll < self.behavior.failure_rate + self.behavior.blackhole_rate:
+                await reader.read()  # until the client gives up
+                return
+            await asyncio.sleep(self.behavior.latency_ms / 1000)
+            first = await reader.readexactly(1)
+            if first == b"\x05":
+                await self.serve_socks5(reader, writer)
+            else:
+                await self.serve_http(first, reader, writer)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+    @staticmethod
+    async def serve_socks5(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        methods = await reader.readexactly((await reader.readexactly(1))[0])
+        if 2 in methods:
+            writer.write(b"\x05\x02")
+            await reader.readexactly((await reader.readexactly(2))[1])  # version, username length, username
+            await reader.readexactly((await reader.readexactly(1))[0])  # password
+            writer.write(b"\x01\x00")
+        else:
+            writer.write(b"\x05\x00")
+        _, command, _, address_type = await reader.readexactly(4)
+        host = await read_socks5_address(reader, address_type)
+        (port,) = struct.unpack("!H", await reader.readexactly(2))
+        if command != 1:
+            return
+        upstream = await asyncio.open_connection(host, port)
+        writer.write(b"\x05\x00\x00\x01" + bytes(6))
+        await writer.drain()
+        await relay((reader, writer), upstream)
+
+    @staticmethod
+    async def serve_http(first: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head = first + await reader.readuntil(b"\r\n\r\n")
+        method, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+        if method == "CONNECT":
+            host, _, port = target.rpartition(":")
+            upstream = await asyncio.open_connection(host, int(port))
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await writer.drain()
+        else:
+            hostport = target.split("://", 1)[1].split("/", 1)[0]
+            host, _, port = hostport.partition(":")
+            upstream = await asyncio.open_connection(host, int(port or 80))
+            upstream[1].write(head)
+        await relay((reader, writer), upstream)
+
+
+class EchoServer:
+    """Minimal IP-echo endpoint: every request gets {"ip": ECHO_IP} and the connection is closed."""
+
+    def __init__(self) -> None:
+        self.server: asyncio.Server | None = None
+        self.port = 0
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/ip"
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            self.requests += 1
+            body = json.dumps({"ip": ECHO_IP}).encode()
+            headers = f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            writer.write(headers.encode() + b"Connection: close\r\n\r\n" + body)
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+
+class ListServer:
+    """Serves one source list body, plain text, on every request."""
+
+    def __init__(self, body: str) -> None:
+        self.body = body.encode()
+        self.server: asyncio.Server | None = None
+        self.port = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/proxies.txt"
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            headers = f"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: {len(self.body)}\r\n"
+            writer.write(headers.encode() + b"Connection: close\r\n\r\n" + self.body)
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
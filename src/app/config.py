@@ -2,14 +2,66 @@ from typing import Annotated
 
 from mm_base6 import BaseSettings, BaseState, Config, setting_field, state_field
 
-config = Config(openapi_tags=["source", "proxy"], ui_menu={"/bot": "bot", "/sources": "sources", "/proxies": "proxies"})
+from app.core.echo import DEFAULT_ECHO_URLS
+
+config = Config(
+    openapi_tags=["source", "proxy", "echo", "metrics"],
+    ui_menu={"/bot": "bot", "/sources": "sources", "/proxies": "proxies"},
+)
 
 
 class Settings(BaseSettings):
     live_last_ok_minutes: Annotated[int, setting_field(15, "live proxies only if they checked less than this minutes ago")]
     proxies_check: Annotated[bool, setting_field(True, "enable periodic proxy check")]
-    max_proxies_check: Annotated[int, setting_field(30, "max proxies to check in one iteration")]
+    proxies_check_concurrency: Annotated[int, setting_field(100, "how many proxies are checked concurrently")]
+    proxy_recheck_lead_seconds: Annotated[
+        int, setting_field(60, "live proxies are rechecked this many seconds before they fall out of the live window")
+    ]
+    proxy_backoff_base_seconds: Annotated[int, setting_field(60, "recheck delay after the first down check, doubles each time")]
+    proxy_backoff_max_minutes: Annotated[int, setting_field(60, "max recheck delay for down proxies")]
+    breaker_failure_threshold: Annotated[
+        int, setting_field(5, "open a host circuit after this many connection failures in a row, 0 disables it")
+    ]
+    breaker_cooldown_seconds: Annotated[int, setting_field(120, "open host circuits allow one trial check after this delay")]
+    checker_processes: Annotated[
+        int, setting_field(0, "spawn this many checker processes, each checks its partition of proxies; 0 checks in-process")
+    ]
+    proxy_lease_seconds: Annotated[
+        int, setting_field(60, "a worker's claim on proxies to check expires after this, then other workers take them")
+    ]
+    proxy_write_batch_size: Annotated[int, setting_field(200, "flush buffered check results after this many results")]
+    proxy_write_flush_ms: Annotated[int, setting_field(500, "flush buffered check results at least this often, ms")]
     proxy_check_timeout: Annotated[float, setting_field(5.1, "timeout for proxy check")]
+    proxy_precheck_timeout: Annotated[float, setting_field(1.5, "timeout for TCP/handshake pre-check, 0 disables it")]
+    proxy_echo_urls: Annotated[
+        str, setting_field(DEFAULT_ECHO_URLS, "comma separated IP-echo urls for proxy check, e.g. this app's /api/echo/ip")
+    ]
+    proxy_echo_hedge_quantile: Annotated[
+        float, setting_field(0.9, "ask the next echo url if the first one is slower than this quantile of response times")
+    ]
+    echo_trusted_proxies: Annotated[
+        str, setting_field("", "comma separated IPs of reverse proxies in front of /api/echo/ip, their X-Forwarded-For is used")
+    ]
+    proxy_reap_batch_size: Annotated[int, setting_field(1000, "expired proxies are deleted in batches of this size")]
+    tombstone_base_hours: Annotated[
+        float, setting_field(6, "deleted dead proxy urls are not re-ingested for this long, doubles on each deletion")
+    ]
+    tombstone_max_hours: Annotated[float, setting_field(168, "max block time for deleted dead proxy urls")]
+    sources_check_concurrency: Annotated[int, setting_field(5, "how many sources are fetched concurrently")]
+    gateway_enabled: Annotated[bool, setting_field(False, "enable the HTTP CONNECT / SOCKS5 gateway over the live proxies")]
+    gateway_host: Annotated[
+        str, setting_field("127.0.0.1", "gateway listen address; any non-loopback address requires gateway_password")
+    ]
+    gateway_port: Annotated[int, setting_field(3001, "gateway listen port")]
+    gateway_username: Annotated[str, setting_field("", "gateway clients authenticate with this username")]
+    gateway_password: Annotated[
+        str, setting_field("", "gateway clients authenticate with this password (SOCKS5 auth, Proxy-Authorization), empty: none")
+    ]
+    gateway_handshake_timeout: Annotated[float, setting_field(10.0, "gateway clients must send their request within this time")]
+    gateway_retries: Annotated[int, setting_field(3, "gateway tries this many upstream proxies per client connection")]
+    gateway_connect_timeout: Annotated[float, setting_field(5.0, "gateway timeout for connecting through an upstream proxy")]
+    gateway_pool_size: Annotated[int, setting_field(2, "pre-connected spare connections per used upstream proxy, 0 disables it")]
+    stats_cache_seconds: Annotated[int, setting_field(5, "how long proxy stats are cached for the UI")]
 
 
 class State(BaseState):
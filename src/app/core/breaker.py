@@ -0,0 +1,72 @@
+import time
+from dataclasses import dataclass
+from enum import StrEnum, unique
+
+
+@unique
+class CircuitState(StrEnum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"  # cooldown is over, one trial check is in flight
+
+
+@dataclass
+class Circuit:
+    failures: int = 0  # consecutive connection failures
+    state: CircuitState = CircuitState.CLOSED
+    opened_at: float = 0.0
+    trial_started_at: float = 0.0  # when the half-open trial was allowed
+
+
+class CircuitBreaker:
+    """Circuit breaker keyed by host or endpoint (host:port).
+
+    After `threshold` consecutive connection failures the circuit opens and checks for the key are skipped.
+    Once `cooldown` seconds have passed, a single half-open trial is allowed: success closes the circuit,
+    failure opens it for another cooldown. A trial whose result is never recorded (the check was cancelled
+    or didn't get to connect) is replaced by a new one after `trial_timeout` seconds.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 120, trial_timeout: float = 60) -> None:
+        self.threshold = threshold  # 0 disables the breaker
+        self.cooldown = cooldown
+        self.trial_timeout = trial_timeout
+        self.circuits: dict[str, Circuit] = {}
+
+    def allow(self, key: str) -> bool:
+        circuit = self.circuits.get(key)
+        if circuit is None or circuit.state == CircuitState.CLOSED:
+            return True
+        now = time.monotonic()
+        if (circuit.state == CircuitState.OPEN and now - circuit.opened_at >= self.cooldown) or (
+            circuit.state == CircuitState.HALF_OPEN and now - circuit.trial_started_at >= self.trial_timeout
+        ):
+            circuit.state = CircuitState.HALF_OPEN
+            circuit.trial_started_at = now
+            return True
+        return False
+
+    def record(self, key: str, connected: bool) -> CircuitState | None:
+        """Record a connection attempt. Returns the new state if the circuit has just opened or closed."""
+        circuit = self.circuits.get(key)
+        if connected:
+            if circuit is None:
+                return None
+            del self.circuits[key]
+            return CircuitState.CLOSED if circuit.state != CircuitState.CLOSED else None
+
+        if self.threshold <= 0:
+            return None
+        circuit = self.circuits.setdefault(key, Circuit())
+        circuit.failures += 1
+        if circuit.state == CircuitState.HALF_OPEN:  # the trial failed, wait another cooldown
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = time.monotonic()
+        elif circuit.state == CircuitState.CLOSED and circuit.failures >= self.threshold:
+            circuit.state = CircuitState.OPEN
+            circuit.opened_at = time.monotonic()
+            return CircuitState.OPEN
+        return None
+
+    def open_keys(self) -> list[str]:
+        return [key for key, circuit in self.circuits.items() if circuit.state != CircuitState.CLOSED]
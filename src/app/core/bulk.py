@@ -0,0 +1,83 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+WriteOp = UpdateOne | DeleteOne
+
+
+class BulkWriteBuffer:
+    """Buffers write operations and flushes them as one unordered bulk_write,
+    every `batch_size` operations or every `flush_interval` seconds, whichever comes first."""
+
+    def __init__(
+        self,
+        collection: AsyncCollection[Any],
+        batch_size: int = 200,
+        flush_interval: float = 0.5,
+        on_flush: Callable[[float], None] | None = None,  # gets the bulk_write duration, seconds
+    ) -> None:
+        self.collection = collection
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ops: list[tuple[ObjectId, WriteOp]] = []  # (document id, operation)
+        self.flushing: set[ObjectId] = set()  # documents whose operations are being written right now
+        self.task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def pending_ids(self) -> set[ObjectId]:
+        """Documents with operations that are not written yet."""
+        return {id for id, _ in self.ops} | self.flushing
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self._run(), name="bulk_write_buffer")
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.task
+            self.task = None
+        await self.flush()
+
+    async def add(self, id: ObjectId, op: WriteOp) -> None:
+        self.ops.append((id, op))
+        if len(self.ops) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> int:
+        if not self.ops:
+            return 0
+        ops, self.ops = self.ops, []
+        ids = {id for id, _ in ops}
+        self.flushing |= ids
+        started_at = time.monotonic()
+        try:
+            await self.collection.bulk_write([op for _, op in ops], ordered=False)
+        except BulkWriteError as e:
+            logger.warning("bulk write errors", extra={"errors": e.details.get("writeErrors", [])[:10]})
+        except Exception:
+            logger.exception("bulk write failed, %d operations are lost", len(ops))
+        finally:
+            self.flushing -= ids
+            if self.on_flush is not None:
+                self.on_flush(time.monotonic() - started_at)
+        return len(ops)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
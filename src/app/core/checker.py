@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable
+
+from bson import ObjectId
+from pydantic import BaseModel
+
+from app.core.db import Proxy
+from app.core.metrics import RateCounter
+
+logger = logging.getLogger(__name__)
+
+
+class CheckPoolStats(BaseModel):
+    running: bool
+    concurrency: int
+    queue_depth: int
+    in_flight: int
+    checks_per_minute: int
+
+
+class CheckPool:
+    """Long-running check pipeline: a producer streams due proxies into a bounded queue,
+    N consumers pull from it continuously, so one slow proxy never holds up the others."""
+
+    def __init__(
+        self,
+        fetch_due: Callable[[int], Awaitable[list[Proxy]]],  # claims up to N due proxies for this worker
+        check: Callable[[Proxy], Awaitable[object]],
+        counter: RateCounter,  # completed checks
+        idle_sleep: float = 1.0,
+    ) -> None:
+        self.fetch_due = fetch_due
+        self.check = check
+        self.idle_sleep = idle_sleep
+        self.concurrency = 0
+        self.queue: asyncio.Queue[Proxy] = asyncio.Queue()
+        self.pending: set[ObjectId] = set()  # queued or in flight, the producer must not enqueue them again
+        self.in_flight = 0
+        self.tasks: list[asyncio.Task[None]] = []
+        self.counter = counter
+
+    @property
+    def running(self) -> bool:
+        return bool(self.tasks)
+
+    def stats(self) -> CheckPoolStats:
+        return CheckPoolStats(
+            running=self.running,
+            concurrency=self.concurrency,
+            queue_depth=self.queue.qsize(),
+            in_flight=self.in_flight,
+            checks_per_minute=self.counter.count(60),
+        )
+
+    async def start(self, concurrency: int) -> None:
+        """Start the pool, or restart it if the concurrency has changed."""
+        concurrency = max(concurrency, 1)
+        if self.running and concurrency == self.concurrency:
+            return
+        await self.stop()
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        self.tasks = [asyncio.create_task(self._produce(), name="check_pool_producer")]
+        self.tasks += [asyncio.create_task(self._consume(), name=f"check_pool_consumer_{i}") for i in range(self.concurrency)]
+        logger.info("check pool started, concurrency=%d", self.concurrency)
+
+    async def stop(self) -> None:
+        if not self.running:
+            return
+        for task in self.tasks:
+            task.cancel()
+        for task in self.tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self.tasks = []
+        self.pending.clear()
+        self.in_flight = 0
+        logger.info("check pool stopped")
+
+    async def _produce(self) -> None:
+        while True:
+            room = self.queue.maxsize - self.queue.qsize()
+            if room <= 0:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                proxies = await self.fetch_due(room)
+            except Exception:
+                logger.exception("check pool: failed to fetch due proxies")
+                await asyncio.sleep(self.idle_sleep)
+                continue
+            new = [p for p in proxies if p.id not in self.pending][:room]
+            for proxy in new:
+                self.pending.add(proxy.id)
+                await self.queue.put(proxy)
+            if not new:
+                await asyncio.sleep(self.idle_sleep)
+
+    async def _consume(self) -> None:
+        while True:
+            proxy = await self.queue.get()
+            self.in_flight += 1
+            try:
+                await self.check(proxy)
+                self.counter.add()
+            except Exception:
+                logger.exception("check pool: check failed", extra={"id": proxy.id})
+            finally:
+                self.in_flight -= 1
+                self.pending.discard(proxy.id)
+                self.queue.task_done()
@@ -0,0 +1,113 @@
+import asyncio
+import contextlib
+import ipaddress
+import json
+import statistics
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from mm_http import http_request
+
+DEFAULT_ECHO_URLS = "https://api.ipify.org/?format=json, https://httpbin.org/ip"
+
+
+class EchoChecker:
+    """Detects the exit IP of a proxy with IP-echo endpoints, using hedged requests.
+
+    The primary endpoint (round-robin over the list) is asked alone. A request to the next endpoint is sent only
+    if the primary has not answered within the `quantile` of recent primary response times, or has failed.
+    """
+
+    MIN_SAMPLES = 20  # until then, DEFAULT_HEDGE_DELAY is used
+    DEFAULT_HEDGE_DELAY = 1.0
+
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+        self.quantile = 0.9
+        self.latencies: deque[float] = deque(maxlen=500)  # seconds, successful primary requests
+        self.counter = 0  # round-robin over urls
+
+    def configure(self, urls: str, quantile: float) -> None:
+        self.urls = [u.strip() for u in urls.split(",") if u.strip()] or [u.strip() for u in DEFAULT_ECHO_URLS.split(",")]
+        self.quantile = min(max(quantile, 0.01), 0.99)
+
+    def target(self) -> tuple[str, int]:
+        """Host and port of the first echo url, the target for CONNECT pre-checks."""
+        parsed = urlparse(self.urls[0])
+        return parsed.hostname or "", parsed.port or (443 if parsed.scheme == "https" else 80)
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < self.MIN_SAMPLES:
+            return self.DEFAULT_HEDGE_DELAY
+        return statistics.quantiles(self.latencies, n=100)[round(self.quantile * 100) - 1]
+
+    async def get_ip(self, proxy: str, timeout: float) -> str | None:
+        primary = self.urls[self.counter % len(self.urls)]
+        hedge = self.urls[(self.counter + 1) % len(self.urls)] if len(self.urls) > 1 else None
+        self.counter += 1
+
+        started_at = time.monotonic()
+        first = asyncio.create_task(echo_ip(primary, proxy, timeout))
+        tasks = [first]
+        try:
+            await asyncio.wait([first], timeout=self.hedge_delay())
+            if first.done() and first.result():
+                self.latencies.append(time.monotonic() - started_at)
+                return first.result()
+            remaining = timeout - (time.monotonic() - started_at)
+            if hedge is None or remaining <= 0:
+                return await first
+            tasks.append(asyncio.create_task(echo_ip(hedge, proxy, remaining)))
+            for task in asyncio.as_completed([t for t in tasks if not t.done()]):
+                ip = await task
+                if ip:
+                    if first.done() and first.result() == ip:
+                        self.latencies.append(time.monotonic() - started_at)
+                    return ip
+            return None
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await t
+
+
+async def echo_ip(url: str, proxy: str | None, timeout: float) -> str | None:
+    res = await http_request(url, proxy=proxy, timeout=timeout)
+    if res.is_err():
+        return None
+    return parse_echo_ip(res.body)
+
+
+def parse_echo_ip(body: str | None) -> str | None:
+    """Parse an IP-echo response: {"ip": ...} (ipify, own echo), {"origin": ...} (httpbin) or plain text."""
+    if not body:
+        return None
+    value = body.strip()
+    if value.startswith("{"):
+        try:
+            data = json.loads(value)
+        except ValueError:
+            return None
+        value = (data.get("ip") or data.get("origin")) if isinstance(data, dict) else None
+        if not isinstance(value, str):
+            return None
+        value = value.split(",")[0].strip()  # httpbin: "client, proxy" for some transparent proxies
+    try:
+        return str(ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+def forwarded_client_ip(peer: str | None, forwarded_for: str | None, trusted_proxies: str) -> str | None:
+    """The client address of an echo request.
+
+    A checked proxy can send any X-Forwarded-For, so it is used only when the peer is a trusted reverse proxy
+    (comma separated `trusted_proxies`). That one appends the address it saw, earlier entries come from the client.
+    """
+    trusted = {ip.strip() for ip in trusted_proxies.split(",") if ip.strip()}
+    if forwarded_for and peer in trusted:
+        return forwarded_for.split(",")[-1].strip()
+    return peer
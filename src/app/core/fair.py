@@ -0,0 +1,120 @@
+import math
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.core.db import Proxy
+from app.core.metrics import RateCounter
+
+Fetch = Callable[[str, int], Awaitable[list[Proxy]]]  # (source, limit) -> claimed due proxies of the source
+
+
+@dataclass(frozen=True, slots=True)
+class SourceShare:
+    weight: float = 1.0
+    min_per_minute: float = 0  # claims per minute the source gets first, as long as it has due proxies
+
+
+class FairScheduler:
+    """Splits the check capacity between sources with deficit round-robin, so one big source can't starve the others.
+
+    Sources take turns; each turn adds `quantum * weight` to the source's deficit, and it claims up to that many
+    of its due proxies. A source which has fewer due proxies than it may claim loses its deficit and is skipped
+    for `drained_seconds`. Before the round-robin, sources which claimed less than their minimum in the last minute
+    get the difference.
+    """
+
+    def __init__(self, quantum: int = 20, drained_seconds: float = 1.0) -> None:
+        self.quantum = quantum
+        self.drained_seconds = drained_seconds
+        self.order: list[str] = []  # sources in round-robin order
+        self.position = 0  # whose turn it is
+        self.turn_open = False  # the source got its quantum, but the last claim ran out of room before it was used
+        self.deficits: dict[str, float] = {}
+        self.drained: dict[str, float] = {}  # source -> skipped until this monotonic time
+        self.claimed: dict[str, RateCounter] = {}  # source -> claims, for the minimums
+
+    def claim_rate(self, source: str) -> int:
+        """Claims of the source in the last minute."""
+        counter = self.claimed.get(source)
+        return counter.count(60) if counter else 0
+
+    async def claim(self, limit: int, shares: dict[str, SourceShare], fetch: Fetch) -> list[Proxy]:
+        self._set_sources(sorted(shares))
+        now = time.monotonic()
+        res: list[Proxy] = []
+
+        async def take(source: str, n: int) -> int:
+            proxies = await fetch(source, n)
+            res.extend(proxies)
+            if proxies:
+                self.claimed.setdefault(source, RateCounter(window_seconds=60)).add(len(proxies))
+            if len(proxies) < n:
+                self.drained[source] = now + self.drained_seconds
+                self.deficits[source] = 0
+            return len(proxies)
+
+        for source, share in shares.items():
+            if len(res) >= limit:
+                return res
+            behind = int(share.min_per_minute) - self.claim_rate(source)
+            if behind > 0 and self.drained.get(source, 0) <= now:
+                await take(source, min(behind, limit - len(res)))
+
+        idle = 0  # turns in a row which could not claim anything
+        waiting = False  # some of these turns had a deficit below one proxy: a small weight, it grows over turns
+        while len(res) < limit:
+            if idle >= len(self.order):
+                if not waiting:
+                    break
+                self._skip_rounds(shares, now)
+                idle, waiting = 0, False
+            source = self.order[self.position]
+            weight = shares[source].weight
+            if weight <= 0 or self.drained.get(source, 0) > now:
+                self.deficits[source] = 0
+                self._next_turn()
+                idle += 1
+                continue
+            if not self.turn_open:
+                self.deficits[source] += self.quantum * weight
+            quota = min(int(self.deficits[source]), limit - len(res))
+            taken = await take(source, quota) if quota > 0 else 0
+            if self.drained.get(source, 0) <= now:
+                self.deficits[source] -= taken
+            if len(res) >= limit and self.deficits[source] >= 1:
+                self.turn_open = True  # the source goes on with the next claim
+                break
+            self._next_turn()
+            if taken:
+                idle, waiting = 0, False
+            else:
+                idle += 1
+                waiting = waiting or quota == 0
+        return res
+
+    def _skip_rounds(self, shares: dict[str, SourceShare], now: float) -> None:
+        """Adds at once the quanta of the rounds in which no source would reach a whole proxy to claim.
+
+        Without it, a tiny weight would take a round per `quantum * weight` of deficit, without ever yielding to the loop.
+        """
+        growth = {
+            s: self.quantum * shares[s].weight for s in self.order if shares[s].weight > 0 and self.drained.get(s, 0) <= now
+        }
+        rounds = min(math.ceil((1 - self.deficits[s]) / g) for s, g in growth.items()) - 1
+        for s, g in growth.items():
+            self.deficits[s] += max(rounds, 0) * g
+
+    def _set_sources(self, sources: list[str]) -> None:
+        if sources == self.order:
+            return
+        self.order = sources
+        self.position = self.position % len(sources) if sources else 0
+        self.turn_open = False
+        self.deficits = {s: self.deficits.get(s, 0) for s in sources}
+        self.drained = {s: t for s, t in self.drained.items() if s in self.deficits}
+        self.claimed = {s: c for s, c in self.claimed.items() if s in self.deficits}
+
+    def _next_turn(self) -> None:
+        self.position = (self.position + 1) % len(self.order)
+        self.turn_open = False
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from enum import StrEnum, unique
+
+from app.core.db import Protocol
+
+
+@unique
+class LiveEventType(StrEnum):
+    ADDED = "added"
+    REMOVED = "removed"
+    RESET = "reset"  # the index was rebuilt, subscribers need a new snapshot
+
+
+@dataclass(frozen=True, slots=True)
+class LiveEvent:
+    seq: int
+    type: LiveEventType
+    url: str = ""
+    source: str = ""
+    protocol: Protocol | None = None
+    proxy_ip: str | None = None
+
+    def matches(self, sources: tuple[str, ...] | None, protocol: Protocol | None) -> bool:
+        if self.type == LiveEventType.RESET:
+            return True
+        return (not sources or self.source in sources) and (protocol is None or self.protocol == protocol)
+
+    def to_sse(self, epoch: str) -> str:
+        data = {k: v for k, v in asdict(self).items() if k not in ("seq", "type")}
+        return sse_message(self.type, data, event_id(epoch, self.seq))
+
+
+class LiveFeed:
+    """Membership changes of the live index, numbered by a sequence, for push subscribers.
+
+    The last `size` events are kept in a ring buffer, so a subscriber that reconnects with its last seen sequence
+    gets only the events it missed. If they have already left the buffer, it has to start from a new snapshot.
+    Sequences restart at zero with the process, so event ids carry the `epoch` of the feed they come from.
+    """
+
+    def __init__(self, size: int = 10_000) -> None:
+        self.epoch = f"{time.time_ns():x}"
+        self.seq = 0
+        self.events: deque[LiveEvent] = deque(maxlen=size)
+        self.changed = asyncio.Event()
+
+    def publish(
+        self,
+        type_: LiveEventType,
+        url: str = "",
+        source: str = "",
+        protocol: Protocol | None = None,
+        proxy_ip: str | None = None,
+    ) -> None:
+        self.seq += 1
+        self.events.append(LiveEvent(self.seq, type_, url, source, protocol, proxy_ip))
+        # wake everyone waiting on the current event, later waiters get a fresh one
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def parse_event_id(self, id: str) -> int | None:
+        """The sequence of an event id of this feed, None for a malformed id or one from another epoch."""
+        epoch, _, seq = id.rpartition(":")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def since(self, seq: int) -> list[LiveEvent] | None:
+        """Events after `seq`, or None if some of them are not in the buffer anymore."""
+        if seq > self.seq:
+            return None
+        if seq == self.seq:
+            return []
+        if not self.events or self.events[0].seq > seq + 1:
+            return None
+        start = seq + 1 - self.events[0].seq
+        return [self.events[i] for i in range(start, len(self.events))]
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        """Wait until there are events after `seq`. Returns False on timeout."""
+        if self.seq > seq:
+            return True
+        try:
+            async with asyncio.timeout(timeout):
+                await self.changed.wait()
+        except TimeoutError:
+            return False
+        return True
+
+
+def event_id(epoch: str, seq: int) -> str:
+    return f"{epoch}:{seq}"
+
+
+def sse_message(event: str, data: object, id: str | None = None) -> str:
+    lines = [f"event: {event}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
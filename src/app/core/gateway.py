@@ -0,0 +1,457 @@
+import asyncio
+import base64
+import binascii
+import contextlib
+import hmac
+import ipaddress
+import logging
+import struct
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from urllib.parse import unquote, urlparse
+
+from app.core.live import LiveProxy
+from app.core.probe import socks5_handshake
+
+logger = logging.getLogger(__name__)
+
+Stream = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+PIPE_CHUNK_SIZE = 64 * 1024
+HOP_BY_HOP_HEADERS = {"proxy-connection", "proxy-authorization", "connection", "keep-alive"}
+
+
+class UpstreamError(Exception):
+    """The upstream proxy is unreachable or broke the protocol, it's reported as down."""
+
+
+class TargetError(Exception):
+    """The upstream proxy works, but refused the target (unreachable host, policy). Another upstream may succeed."""
+
+
+@dataclass
+class GatewayStats:
+    connections: int = 0  # currently open client connections
+    tunnels: int = 0  # tunnels opened since start
+    upstream_failures: int = 0
+    pooled_hits: int = 0  # tunnels opened over a pre-connected upstream connection
+    idle_upstreams: int = 0
+
+
+@dataclass
+class PooledConnection:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    created_at: float = field(default_factory=time.monotonic)
+
+    def is_usable(self, max_idle: float) -> bool:
+        return time.monotonic() - self.created_at < max_idle and not self.reader.at_eof() and not self.writer.is_closing()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class UpstreamPool:
+    """Pre-connected upstream connections, keyed by proxy url.
+
+    A tunnel consumes its connection, so connections are not returned to the pool. Instead, every time an upstream
+    is used, a spare connection to it is opened in the background (TCP connect, plus greeting/auth for SOCKS5),
+    and the next tunnel through a hot upstream only has to send the CONNECT command.
+    """
+
+    def __init__(self, size: int = 2, max_idle: float = 30) -> None:
+        self.size = size  # spare connections per upstream, 0 disables pooling
+        self.max_idle = max_idle
+        self.idle: dict[str, deque[PooledConnection]] = {}
+        self.warming: set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self.idle.values())
+
+    def acquire(self, url: str) -> PooledConnection | None:
+        queue = self.idle.get(url)
+        while queue:
+            conn = queue.popleft()
+            if conn.is_usable(self.max_idle):
+                return conn
+            conn.close()
+        return None
+
+    def replenish(self, url: str, timeout: float) -> None:
+        if len(self.idle.get(url, ())) + sum(1 for t in self.warming if t.get_name() == url) >= self.size:
+            return
+        task = asyncio.create_task(self._warm(url, timeout), name=url)
+        self.warming.add(task)
+        task.add_done_callback(self.warming.discard)
+
+    def discard(self, url: str) -> None:
+        for conn in self.idle.pop(url, ()):
+            conn.close()
+
+    def prune(self) -> None:
+        for url in list(self.idle):
+            queue = self.idle[url]
+            fresh = deque(c for c in queue if c.is_usable(self.max_idle))
+            for conn in queue:
+                if conn not in fresh:
+                    conn.close()
+            if fresh:
+                self.idle[url] = fresh
+            else:
+                del self.idle[url]
+
+    async def close(self) -> None:
+        for task in list(self.warming):
+            task.cancel()
+        await asyncio.gather(*self.warming, return_exceptions=True)
+        for url in list(self.idle):
+            self.discard(url)
+
+    async def _warm(self, url: str, timeout: float) -> None:
+        try:
+            reader, writer = await open_upstream(url, timeout)
+        except UpstreamError:
+            return
+        self.idle.setdefault(url, deque()).append(PooledConnection(reader, writer))
+
+
+class ProxyGateway:
+    """A single HTTP CONNECT / SOCKS5 endpoint in front of the live proxies.
+
+    Every client connection gets a tunnel through an upstream picked from the live set. If the upstream fails,
+    it's reported (and taken out of the live set by the service) and the next upstream is tried, up to `retries` times.
+    Plain HTTP requests with an absolute url are forwarded over a tunnel to the target host as well.
+
+    With `credentials` set, clients authenticate with SOCKS5 username/password or HTTP Basic Proxy-Authorization.
+    Without them, the gateway listens on loopback addresses only.
+    """
+
+    def __init__(
+        self,
+        pick_upstream: Callable[[set[str]], LiveProxy | None],
+        report_failure: Callable[[str], Awaitable[None]],
+    ) -> None:
+        self.pick_upstream = pick_upstream  # next live upstream, except the given urls
+        self.report_failure = report_failure
+        self.pool = UpstreamPool()
+        self.retries = 3
+        self.connect_timeout = 5.0
+        self.handshake_timeout = 10.0  # a client must send its greeting and request within this time
+        self.credentials: tuple[str, str] | None = None  # (username, password) clients authenticate with
+        self.server: asyncio.Server | None = None
+        self.address: tuple[str, int] | None = None  # where the server listens
+        self.refused: tuple[str, int] | None = None  # an address it was not allowed to listen on, logged once
+        self.stats = GatewayStats()
+
+    async def listen(self, address: tuple[str, int] | None) -> None:
+        """Move the listener to the address, None stops it. Non-loopback addresses need credentials."""
+        if address is not None and self.credentials is None and not is_loopback(address[0]):
+            if address != self.refused:
+                logger.error("proxy gateway is not started on %s:%d: credentials are required off loopback", *address)
+                self.refused = address
+            address = None
+        else:
+            self.refused = None
+        if address == self.address:
+            return
+        if self.server is not None:
+            self.server.close()
+            self.server = self.address = None
+            logger.info("proxy gateway stopped")
+        if address is not None:
+            self.server = await asyncio.start_server(self.handle_client, *address)
+            self.address = address
+            logger.info("proxy gateway listening on %s:%d", *address)
+
+    async def stop(self) -> None:
+        await self.listen(None)
+        await self.pool.close()
+
+    def get_stats(self) -> GatewayStats:
+        self.stats.idle_upstreams = len(self.pool)
+        return self.stats
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.connections += 1
+        try:
+            async with asyncio.timeout(self.handshake_timeout):
+                first = await reader.readexactly(1)
+            if first == b"\x05":
+                await self.serve_socks5(reader, writer)
+            else:
+                await self.serve_http(first, reader, writer)
+        except (OSError, TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.debug("gateway client error: %s", e)
+        finally:
+            self.stats.connections -= 1
+            writer.close()
+            with contextlib.suppress(OSError):
+                await writer.wait_closed()
+
+    async def serve_socks5(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async with asyncio.timeout(self.handshake_timeout):
+            target = await self.socks5_handshake(reader, writer)
+        if target is None:
+            return
+        upstream = await self.open_tunnel(target)
+        if upstream is None:
+            writer.write(b"\x05\x04\x00\x01" + bytes(6))  # host unreachable
+            return
+        writer.write(b"\x05\x00\x00\x01" + bytes(6))
+        await writer.drain()
+        await relay((reader, writer), upstream)
+
+    async def socks5_handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> tuple[str, int] | None:
+        """RFC 1928 greeting and CONNECT request, with RFC 1929 username/password auth if credentials are set.
+        Returns the target, or None if the client was refused."""
+        methods = await reader.readexactly((await reader.readexactly(1))[0])
+        method = 0 if self.credentials is None else 2
+        if method not in methods:
+            writer.write(b"\x05\xff")
+            return None
+        writer.write(bytes([5, method]))
+        if self.credentials is not None:
+            await reader.readexactly(1)  # auth version
+            username = await reader.readexactly((await reader.readexactly(1))[0])
+            password = await reader.readexactly((await reader.readexactly(1))[0])
+            if not self.authorized(username, password):
+                logger.debug("gateway socks5 auth failed")
+                writer.write(b"\x01\x01")
+                return None
+            writer.write(b"\x01\x00")
+        version, command, _, address_type = await reader.readexactly(4)
+        if version != 5 or command != 1:  # CONNECT only
+            writer.write(b"\x05\x07\x00\x01" + bytes(6))
+            return None
+        host = await read_socks5_address(reader, address_type)
+        (port,) = struct.unpack("!H", await reader.readexactly(2))
+        return host, port
+
+    async def serve_http(self, first: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async with asyncio.timeout(self.handshake_timeout):
+            head = first + await reader.readuntil(b"\r\n\r\n")
+        request_line, *headers = head.decode("latin-1").split("\r\n")
+        method, target, version = request_line.split(" ", 2)
+        if not self.http_authorized(headers):
+            logger.debug("gateway http auth failed")
+            writer.write(
+                b"HTTP/1.1 407 Proxy Authentication Required\r\n"
+                b'Proxy-Authenticate: Basic realm="mm-proxy"\r\nContent-Length: 0\r\n\r\n'
+            )
+            return
+
+        if method == "CONNECT":
+            host, _, port = target.rpartition(":")
+            upstream = await self.open_tunnel((host.strip("[]"), int(port)))
+            if upstream is None:
+                writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+                return
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await writer.drain()
+            await relay((reader, writer), upstream)
+            return
+
+        url = urlparse(target)
+        if url.scheme != "http" or not url.hostname:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return
+        upstream = await self.open_tunnel((url.hostname, url.port or 80))
+        if upstream is None:
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+            return
+        # one request per connection: the next one on a keep-alive connection could go to another host
+        kept = [h for h in headers if h and h.split(":", 1)[0].strip().lower() not in HOP_BY_HOP_HEADERS]
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+        upstream[1].write("\r\n".join([f"{method} {path} {version}", *kept, "Connection: close", "", ""]).encode("latin-1"))
+        await relay((reader, writer), upstream)
+
+    def authorized(self, username: bytes, password: bytes) -> bool:
+        if self.credentials is None:
+            return True
+        expected_username, expected_password = (c.encode() for c in self.credentials)
+        # both are compared, in constant time, so the timing doesn't tell which one was wrong
+        return hmac.compare_digest(username, expected_username) & hmac.compare_digest(password, expected_password)
+
+    def http_authorized(self, headers: list[str]) -> bool:
+        if self.credentials is None:
+            return True
+        for header in headers:
+            name, _, value = header.partition(":")
+            if name.strip().lower() != "proxy-authorization":
+                continue
+            scheme, _, encoded = value.strip().partition(" ")
+            if scheme.lower() != "basic":
+                return False
+            try:
+                username, _, password = base64.b64decode(encoded.strip(), validate=True).partition(b":")
+            except binascii.Error:
+                return False
+            return self.authorized(username, password)
+        return False
+
+    async def open_tunnel(self, target: tuple[str, int]) -> Stream | None:
+        """A tunnel to the target through the first upstream that works, None if all attempts failed."""
+        tried: set[str] = set()
+        for _ in range(max(self.retries, 1)):
+            upstream = self.pick_upstream(tried)
+            if upstream is None:
+                return None
+            tried.add(upstream.url)
+            try:
+                stream = await self.connect_upstream(upstream.url, target)
+            except UpstreamError as e:
+                logger.debug("upstream failed: %s, %s", upstream.url, e)
+                self.stats.upstream_failures += 1
+                self.pool.discard(upstream.url)
+                await self.report_failure(upstream.url)
+                continue
+            except TargetError as e:
+                logger.debug("upstream refused the target: %s, %s", upstream.url, e)
+                continue
+            self.stats.tunnels += 1
+            return stream
+        return None
+
+    async def connect_upstream(self, url: str, target: tuple[str, int]) -> Stream:
+        if self.pool.size > 0:
+            self.pool.replenish(url, self.connect_timeout)
+        pooled = self.pool.acquire(url)
+        if pooled is not None:
+            try:
+                await upstream_connect(url, (pooled.reader, pooled.writer), target, self.connect_timeout)
+            except UpstreamError:
+                pooled.close()  # the idle connection went stale, a fresh one decides
+            else:
+                self.stats.pooled_hits += 1
+                return pooled.reader, pooled.writer
+        stream = await open_upstream(url, self.connect_timeout)
+        try:
+            await upstream_connect(url, stream, target, self.connect_timeout)
+        except (UpstreamError, TargetError):
+            stream[1].close()
+            raise
+        return stream
+
+
+async def open_upstream(url: str, timeout: float) -> Stream:
+    """TCP connection to the upstream proxy; for SOCKS5, the greeting and auth are done as well."""
+    parsed = urlparse(url)
+    if not parsed.hostname or not parsed.port:
+        raise UpstreamError("bad url")
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port)
+    except (OSError, TimeoutError) as e:
+        raise UpstreamError(str(e) or type(e).__name__) from e
+    if parsed.scheme == "socks5":
+        username = unquote(parsed.username) if parsed.username else None
+        password = unquote(parsed.password) if parsed.password else None
+        try:
+            async with asyncio.timeout(timeout):
+                ok = await socks5_handshake(reader, writer, username, password)
+        except (OSError, TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            writer.close()
+            raise UpstreamError(str(e) or type(e).__name__) from e
+        if not ok:
+            writer.close()
+            raise UpstreamError("socks5 handshake failed")
+    return reader, writer
+
+
+async def upstream_connect(url: str, stream: Stream, target: tuple[str, int], timeout: float) -> None:
+    """Ask an opened upstream connection for a tunnel to the target."""
+    parsed = urlparse(url)
+    reader, writer = stream
+    try:
+        async with asyncio.timeout(timeout):
+            if parsed.scheme == "socks5":
+                await socks5_connect(reader, writer, target)
+            else:
+                username = unquote(parsed.username) if parsed.username else None
+                password = unquote(parsed.password) if parsed.password else None
+                await http_connect(reader, writer, target, username, password)
+    except (OSError, TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+        raise UpstreamError(str(e) or type(e).__name__) from e
+
+
+async def socks5_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, target: tuple[str, int]) -> None:
+    host = target[0].encode("idna")
+    writer.write(b"\x05\x01\x00\x03" + bytes([len(host)]) + host + struct.pack("!H", target[1]))
+    await writer.drain()
+    version, reply, _, address_type = await reader.readexactly(4)
+    if version != 5:
+        raise UpstreamError("not a socks5 reply")
+    await read_socks5_address(reader, address_type)
+    await reader.readexactly(2)  # bound port
+    if reply in (3, 4, 5, 6):  # network/host unreachable, connection refused, TTL expired: the target's fault
+        raise TargetError(f"socks5 reply {reply}")
+    if reply != 0:
+        raise UpstreamError(f"socks5 reply {reply}")
+
+
+async def http_connect(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    target: tuple[str, int],
+    username: str | None,
+    password: str | None,
+) -> None:
+    host = f"[{target[0]}]:{target[1]}" if ":" in target[0] else f"{target[0]}:{target[1]}"
+    request = f"CONNECT {host} HTTP/1.1\r\nHost: {host}\r\n"
+    if username is not None:
+        credentials = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+        request += f"Proxy-Authorization: Basic {credentials}\r\n"
+    writer.write((request + "\r\n").encode())
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    parts = head.split(b"\r\n", 1)[0].split()
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/") or not parts[1].isdigit():
+        raise UpstreamError("not an http reply")
+    status = int(parts[1])
+    if status in (502, 503, 504):  # the proxy could not reach the target
+        raise TargetError(f"http status {status}")
+    if status != 200:
+        raise UpstreamError(f"http status {status}")
+
+
+def is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # a hostname may resolve to anything
+
+
+async def read_socks5_address(reader: asyncio.StreamReader, address_type: int) -> str:
+    if address_type == 1:
+        return str(ipaddress.IPv4Address(await reader.readexactly(4)))
+    if address_type == 3:
+        return (await reader.readexactly((await reader.readexactly(1))[0])).decode("idna")
+    if address_type == 4:
+        return str(ipaddress.IPv6Address(await reader.readexactly(16)))
+    raise ValueError(f"unknown socks5 address type: {address_type}")
+
+
+async def relay(client: Stream, upstream: Stream) -> None:
+    """Copy bytes both ways until both sides are done, then close the upstream."""
+    try:
+        await asyncio.gather(pipe(client[0], upstream[1]), pipe(upstream[0], client[1]))
+    finally:
+        upstream[1].close()
+        with contextlib.suppress(OSError):
+            await upstream[1].wait_closed()
+
+
+async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    with contextlib.suppress(OSError):
+        while data := await reader.read(PIPE_CHUNK_SIZE):
+            writer.write(data)
+            await writer.drain()
+    with contextlib.suppress(OSError, RuntimeError):
+        if writer.can_write_eof() and not writer.is_closing():
+            writer.write_eof()
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+from enum import StrEnum, unique
+from typing import Any
+from urllib.parse import urlparse
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pydantic import BaseModel
+from pymongo.asynchronous.collection import AsyncCollection
+
+from app.core.db import Protocol, Status
+
+
+@unique
+class ProxySort(StrEnum):
+    STATUS = "status"
+    CHECKED_AT = "checked_at"
+    LAST_OK_AT = "last_ok_at"
+
+
+# only the fields the listing shows, never the whole document
+LISTING_PROJECTION = {
+    "url": 1,
+    "source": 1,
+    "protocol": 1,
+    "status": 1,
+    "proxy_ip": 1,
+    "checked_at": 1,
+    "last_ok_at": 1,
+    "latency_ms": 1,
+    "history.ok": 1,
+    "history.down": 1,
+}
+
+
+class ProxyRow(BaseModel):
+    id: str
+    url: str
+    source: str
+    protocol: Protocol
+    status: Status
+    proxy_ip: str | None = None
+    checked_at: datetime | None = None
+    last_ok_at: datetime | None = None
+    latency_ms: float | None = None
+    history_ok_count: int = 0
+    history_down_count: int = 0
+
+    @property
+    def endpoint(self) -> str:
+        parsed = urlparse(self.url)
+        return f"{parsed.hostname}:{parsed.port}"
+
+    @property
+    def gateway_type(self) -> str:
+        if self.proxy_ip is None:
+            return ""
+        return "gateway" if self.proxy_ip != urlparse(self.url).hostname else "direct"
+
+    @classmethod
+    def from_document(cls, doc: dict[str, Any]) -> ProxyRow:
+        history = doc.get("history") or {}
+        return cls(
+            id=str(doc["_id"]),
+            url=doc["url"],
+            source=doc["source"],
+            protocol=doc["protocol"],
+            status=doc["status"],
+            proxy_ip=doc.get("proxy_ip"),
+            checked_at=doc.get("checked_at"),
+            last_ok_at=doc.get("last_ok_at"),
+            latency_ms=doc.get("latency_ms"),
+            history_ok_count=history.get("ok", 0),
+            history_down_count=history.get("down", 0),
+        )
+
+
+class ProxyPage(BaseModel):
+    proxies: list[ProxyRow]
+    next_cursor: str | None  # pass it as `cursor` for the next page, None on the last page
+
+
+class ProxyListing:
+    """One page of the proxy listing, sorted by (sort field, _id) and read with keyset pagination.
+
+    The cursor is the sort key of the last row, so every page is an index range scan, however deep it is.
+    Rows are decoded from the Mongo cursor as they are iterated; `next_cursor` is set once the iteration is done.
+    """
+
+    def __init__(
+        self,
+        collection: AsyncCollection[dict[str, Any]],
+        query: dict[str, object],
+        sort: ProxySort,
+        descending: bool,
+        limit: int,
+        cursor: str | None = None,
+    ) -> None:
+        self.collection = collection
+        self.query = query
+        self.sort = sort
+        self.descending = descending
+        self.limit = limit
+        self.after = decode_cursor(cursor, sort) if cursor else None
+        self.next_cursor: str | None = None
+
+    async def __aiter__(self) -> AsyncIterator[ProxyRow]:
+        query = self.query
+        if self.after is not None:
+            query = {"$and": [query, keyset_query(self.sort, self.descending, *self.after)]}
+        direction = -1 if self.descending else 1
+        cursor = (
+            self.collection.find(query, LISTING_PROJECTION)
+            .sort([(self.sort.value, direction), ("_id", direction)])
+            .limit(self.limit + 1)  # the extra row only tells that there is a next page
+        )
+        count = 0
+        last: dict[str, Any] | None = None
+        try:
+            async for doc in cursor:
+                if count == self.limit:
+                    if last is not None:
+                        self.next_cursor = encode_cursor(last.get(self.sort.value), last["_id"])
+                    break
+                yield ProxyRow.from_document(doc)
+                count += 1
+                last = doc
+        finally:
+            await cursor.close()
+
+    async def to_page(self) -> ProxyPage:
+        proxies = [row async for row in self]
+        return ProxyPage(proxies=proxies, next_cursor=self.next_cursor)
+
+
+def keyset_query(sort: ProxySort, descending: bool, value: object, id: ObjectId) -> dict[str, object]:
+    """Rows after (value, id) in the listing order. Mongo sorts nulls first, so they come first ascending and last descending."""
+    field = sort.value
+    op = "$lt" if descending else "$gt"
+    if value is None:
+        same = {field: None, "_id": {op: id}}
+        return same if descending else {"$or": [same, {field: {"$ne": None}}]}
+    after = [{field: {op: value}}, {field: value, "_id": {op: id}}]
+    if descending:
+        after.append({field: None})
+    return {"$or": after}
+
+
+def encode_cursor(value: object, id: ObjectId) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, str(id)]).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: ProxySort) -> tuple[object, ObjectId]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if value is not None and sort != ProxySort.STATUS:
+            value = datetime.fromisoformat(value)
+        return value, ObjectId(id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError(f"bad cursor: {cursor}") from e
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import datetime
+from enum import StrEnum, unique
+
+from app.core.db import Protocol, Proxy
+from app.core.feed import LiveEventType, LiveFeed
+
+GroupKey = tuple[str, Protocol]  # (source, protocol)
+
+
+@unique
+class LiveSort(StrEnum):
+    URL = "url"
+    LATENCY = "latency"
+
+
+@dataclass(frozen=True, slots=True)
+class LiveQuery:
+    sources: tuple[str, ...] | None = None
+    protocol: Protocol | None = None
+    unique_ip: bool = False
+    sort: LiveSort = LiveSort.URL
+    max_latency_ms: float | None = None
+    limit: int | None = None
+
+
+@dataclass(slots=True)
+class LiveProxy:
+    url: str
+    source: str
+    protocol: Protocol
+    proxy_ip: str | None
+    last_ok_at: datetime
+    latency_ms: float | None = None  # EWMA of check round trips
+    success_rate: float = 1.0  # ok share of the check history
+
+    def update_from(self, other: LiveProxy) -> None:
+        self.proxy_ip = other.proxy_ip
+        self.last_ok_at = other.last_ok_at
+        self.latency_ms = other.latency_ms
+        self.success_rate = other.success_rate
+
+    @classmethod
+    def from_proxy(cls, proxy: Proxy) -> LiveProxy | None:
+        if proxy.last_ok_at is None:
+            return None
+        return cls(
+            url=proxy.url,
+            source=proxy.source,
+            protocol=proxy.protocol,
+            proxy_ip=proxy.proxy_ip,
+            last_ok_at=proxy.last_ok_at,
+            latency_ms=proxy.latency_ms,
+            success_rate=proxy.history.ok / proxy.history.length if proxy.history.length else 1.0,
+        )
+
+
+def latency_key(p: LiveProxy) -> tuple[bool, float]:
+    """Sort key: the fastest first, unknown latency last."""
+    return p.latency_ms is None, p.latency_ms or 0.0
+
+
+class LiveGroup:
+    """Live proxies of one (source, protocol).
+
+    `items` is an array with O(1) swap-remove, for random and round-robin picks. The url-sorted view and
+    the consistent-hash ring are rebuilt lazily, only after the membership has changed.
+    """
+
+    def __init__(self) -> None:
+        self.proxies: dict[str, LiveProxy] = {}  # url -> proxy
+        self.items: list[LiveProxy] = []
+        self.positions: dict[str, int] = {}  # url -> index in items
+        self._sorted: list[LiveProxy] | None = None
+        self._ring: tuple[list[int], list[LiveProxy]] | None = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def upsert(self, proxy: LiveProxy) -> bool:
+        """Returns True if the proxy is new in the group. Known proxies are updated in place, so views stay valid."""
+        existing = self.proxies.get(proxy.url)
+        if existing is not None:
+            existing.update_from(proxy)
+            return False
+        self.proxies[proxy.url] = proxy
+        self.positions[proxy.url] = len(self.items)
+        self.items.append(proxy)
+        self._sorted = self._ring = None
+        return True
+
+    def remove(self, url: str) -> bool:
+        if self.proxies.pop(url, None) is None:
+            return False
+        pos = self.positions.pop(url)
+        last = self.items.pop()
+        if last.url != url:
+            self.items[pos] = last
+            self.positions[last.url] = pos
+        self._sorted = self._ring = None
+        return True
+
+    def sorted_by_url(self) -> list[LiveProxy]:
+        if self._sorted is None:
+            self._sorted = sorted(self.items, key=lambda p: p.url)
+        return self._sorted
+
+    def ring(self) -> tuple[list[int], list[LiveProxy]]:
+        """Consistent-hash ring: proxies sorted by the hash of their url, and the hashes."""
+        if self._ring is None:
+            points = sorted((hash64(p.url), p) for p in self.items)
+            self._ring = [h for h, _ in points], [p for _, p in points]
+        return self._ring
+
+
+class LiveIndex:
+    """In-memory index of live proxies, grouped by (source, protocol).
+
+    It's updated by ProxyService.check after each result and rebuilt from Mongo on startup,
+    so the read path never touches the database. Proxies entering and leaving the index are published to `feed`.
+    """
+
+    def __init__(self) -> None:
+        self._groups: dict[GroupKey, LiveGroup] = {}
+        self._url_group: dict[str, GroupKey] = {}  # url -> group, for removals
+        self.feed = LiveFeed()
+        self.data_version = 0  # bumped when latency or proxy_ip of a live proxy changes
+
+    def __len__(self) -> int:
+        return len(self._url_group)
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """(membership, data) versions, for caching query results."""
+        return self.feed.seq, self.data_version
+
+    def groups(self, sources: Iterable[str] | None = None, protocol: Protocol | None = None) -> list[LiveGroup]:
+        return [g for k, g in self._groups.items() if (not sources or k[0] in sources) and (protocol is None or k[1] == protocol)]
+
+    def rebuild(self, proxies: Iterable[LiveProxy]) -> None:
+        self._groups.clear()
+        self._url_group.clear()
+        for proxy in proxies:
+            self._insert(proxy)
+        self.feed.publish(LiveEventType.RESET)
+
+    def upsert(self, proxy: LiveProxy) -> None:
+        key = (proxy.source, proxy.protocol)
+        old_key = self._url_group.get(proxy.url)
+        if old_key is not None and old_key != key:
+            self.discard(proxy.url)
+        elif old_key is not None:
+            existing = self._groups[key].proxies[proxy.url]
+            if existing.latency_ms != proxy.latency_ms or existing.proxy_ip != proxy.proxy_ip:
+                self.data_version += 1
+        if self._insert(proxy):
+            self.feed.publish(LiveEventType.ADDED, proxy.url, proxy.source, proxy.protocol, proxy.proxy_ip)
+
+    def discard(self, url: str) -> bool:
+        key = self._url_group.pop(url, None)
+        if key is None:
+            return False
+        group = self._groups[key]
+        group.remove(url)
+        if not group:
+            del self._groups[key]
+        self.feed.publish(LiveEventType.REMOVED, url, key[0], key[1])
+        return True
+
+    def _insert(self, proxy: LiveProxy) -> bool:
+        key = (proxy.source, proxy.protocol)
+        if key not in self._groups:
+            self._groups[key] = LiveGroup()
+        self._url_group[proxy.url] = key
+        return self._groups[key].upsert(proxy)
+
+    def discard_if(self, predicate: Callable[[LiveProxy], bool]) -> int:
+        urls = [p.url for group in self._groups.values() for p in group.items if predicate(p)]
+        for url in urls:
+            self.discard(url)
+        return len(urls)
+
+    def discard_source(self, source: str) -> int:
+        return self.discard_if(lambda p: p.source == source)
+
+    def expire(self, cutoff: datetime) -> int:
+        """Remove proxies whose last_ok_at is not after the cutoff."""
+        return self.discard_if(lambda p: p.last_ok_at <= cutoff)
+
+    def query(self, cutoff: datetime, q: LiveQuery) -> list[LiveProxy]:
+        """Return live proxies matching the query.
+
+        With unique_ip, only the first proxy per proxy_ip in the sort order is kept (the fastest one for
+        sort=latency), proxies without a detected ip go last.
+        """
+        merged = heapq.merge(*(g.sorted_by_url() for g in self.groups(q.sources, q.protocol)), key=lambda p: p.url)
+        proxies = [p for p in merged if p.last_ok_at > cutoff]
+        if q.max_latency_ms is not None:
+            proxies = [p for p in proxies if p.latency_ms is not None and p.latency_ms <= q.max_latency_ms]
+        if q.sort == LiveSort.LATENCY:
+            proxies.sort(key=latency_key)
+        if q.unique_ip:
+            seen: set[str] = set()
+            with_ip = []
+            without_ip = []
+            for p in proxies:
+                if not p.proxy_ip:
+                    without_ip.append(p)
+                elif p.proxy_ip not in seen:
+                    seen.add(p.proxy_ip)
+                    with_ip.append(p)
+            proxies = with_ip + without_ip
+        if q.limit is not None:
+            proxies = proxies[: q.limit]
+        return proxies
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest())
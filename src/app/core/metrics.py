@@ -0,0 +1,164 @@
+import bisect
+import contextlib
+import time
+from collections.abc import Iterator
+from typing import Any
+
+RATE_WINDOWS = (60, 300, 3600)  # seconds: checks/sec at 1m, 5m, 1h
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+MONGO_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)  # seconds
+
+
+class RateCounter:
+    """Event counter over a sliding window, in fixed memory: a ring of per-bucket counts.
+
+    Each slot remembers the bucket number it was last written for, so stale slots are ignored
+    without a cleanup pass, and adding an event is O(1).
+    """
+
+    def __init__(self, window_seconds: int = 3600, bucket_seconds: int = 1) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.size = window_seconds // bucket_seconds
+        self.counts = [0] * self.size
+        self.epochs = [-1] * self.size  # bucket number of each slot
+
+    def add(self, n: int = 1) -> None:
+        epoch = int(time.monotonic() // self.bucket_seconds)
+        slot = epoch % self.size
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+        self.counts[slot] += n
+
+    def count(self, seconds: int) -> int:
+        """Events in the last `seconds`, with bucket resolution."""
+        now = int(time.monotonic() // self.bucket_seconds)
+        oldest = now - min(seconds // self.bucket_seconds, self.size) + 1
+        return sum(c for c, e in zip(self.counts, self.epochs, strict=True) if e >= oldest)
+
+
+class Histogram:
+    """Prometheus-style histogram: counts per upper bound, plus the sum and count of all observations."""
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"counts": list(self.counts), "sum": self.sum}
+
+
+class Metrics:
+    """Check pipeline metrics of one process.
+
+    Snapshots are plain dicts, so checker processes publish them with their heartbeats
+    and the main process merges them into one Prometheus exposition.
+    """
+
+    def __init__(self) -> None:
+        self.checks = RateCounter()  # counted by the check pool
+        self.check_latency: dict[tuple[str, str], Histogram] = {}  # (outcome, protocol) -> seconds
+        self.mongo: dict[str, Histogram] = {}  # operation -> seconds
+        self.sources: dict[str, tuple[RateCounter, RateCounter]] = {}  # source -> (ok, all) checks, last hour by minutes
+
+    def record_check(self, source: str, protocol: str, outcome: str, seconds: float) -> None:
+        key = (outcome, protocol)
+        if key not in self.check_latency:
+            self.check_latency[key] = Histogram(LATENCY_BUCKETS)
+        self.check_latency[key].observe(seconds)
+        if source not in self.sources:
+            self.sources[source] = (RateCounter(bucket_seconds=60), RateCounter(bucket_seconds=60))
+        ok, total = self.sources[source]
+        total.add()
+        if outcome == "ok":
+            ok.add()
+
+    @contextlib.contextmanager
+    def mongo_timer(self, operation: str) -> Iterator[None]:
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe_mongo(operation, time.monotonic() - started_at)
+
+    def observe_mongo(self, operation: str, seconds: float) -> None:
+        if operation not in self.mongo:
+            self.mongo[operation] = Histogram(MONGO_BUCKETS)
+        self.mongo[operation].observe(seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "checks": {str(w): self.checks.count(w) for w in RATE_WINDOWS},
+            "check_latency": {f"{o}|{p}": h.snapshot() for (o, p), h in self.check_latency.items()},
+            "mongo": {op: h.snapshot() for op, h in self.mongo.items()},
+            "sources": {
+                s: {"ok": ok.count(3600), "all": total.count(3600), "all_5m": total.count(300)}
+                for s, (ok, total) in self.sources.items()
+            },
+        }
+
+
+def merge_snapshots(snapshots: list[dict[str, Any]]) -> dict[str, Any]:
+    """Sum snapshots of several processes."""
+    merged: dict[str, Any] = {"checks": {}, "check_latency": {}, "mongo": {}, "sources": {}}
+    for snapshot in snapshots:
+        for window, n in snapshot.get("checks", {}).items():
+            merged["checks"][window] = merged["checks"].get(window, 0) + n
+        for group in ("check_latency", "mongo"):
+            for key, h in snapshot.get(group, {}).items():
+                target = merged[group].setdefault(key, {"counts": [0] * len(h["counts"]), "sum": 0.0})
+                target["counts"] = [a + b for a, b in zip(target["counts"], h["counts"], strict=True)]
+                target["sum"] += h["sum"]
+        for source, c in snapshot.get("sources", {}).items():
+            target = merged["sources"].setdefault(source, {"ok": 0, "all": 0, "all_5m": 0})
+            for key in target:
+                target[key] += c.get(key, 0)
+    return merged
+
+
+def render_prometheus(snapshot: dict[str, Any], gauges: dict[str, float]) -> str:
+    """Prometheus text exposition format, version 0.0.4."""
+    lines: list[str] = []
+
+    def histogram(name: str, help_: str, bounds: tuple[float, ...], series: dict[str, dict[str, Any]], labels: str) -> None:
+        lines.extend([f"# HELP {name} {help_}", f"# TYPE {name} histogram"])
+        for key, h in sorted(series.items()):
+            label_values = dict(zip(labels.split(","), key.split("|"), strict=True))
+            base = ",".join(f'{k}="{escape_label(v)}"' for k, v in label_values.items())
+            cumulative = 0
+            for bound, count in zip((*map(str, bounds), "+Inf"), h["counts"], strict=True):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {h['sum']}")
+            lines.append(f"{name}_count{{{base}}} {cumulative}")
+
+    lines.extend(["# HELP mm_proxy_checks_per_second Proxy checks per second", "# TYPE mm_proxy_checks_per_second gauge"])
+    for window, n in sorted(snapshot["checks"].items(), key=lambda x: int(x[0])):
+        lines.append(f'mm_proxy_checks_per_second{{window="{window}s"}} {n / int(window):.3f}')
+
+    histogram("mm_proxy_check_duration_seconds", "Check duration", LATENCY_BUCKETS, snapshot["check_latency"], "outcome,protocol")
+    histogram("mm_proxy_mongo_duration_seconds", "Mongo operation duration", MONGO_BUCKETS, snapshot["mongo"], "operation")
+
+    lines.extend(
+        [
+            "# HELP mm_proxy_source_success_ratio Share of ok checks per source, last hour",
+            "# TYPE mm_proxy_source_success_ratio gauge",
+        ]
+    )
+    for source, c in sorted(snapshot["sources"].items()):
+        if c["all"]:
+            lines.append(f'mm_proxy_source_success_ratio{{source="{escape_label(source)}"}} {c["ok"] / c["all"]:.4f}')
+
+    for name, value in gauges.items():
+        lines.extend([f"# TYPE mm_proxy_{name} gauge", f"mm_proxy_{name} {value}"])
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    """Label value escaping of the Prometheus text format: backslash, double quote and line feed."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
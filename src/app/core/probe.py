@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import contextlib
+from enum import StrEnum, unique
+from urllib.parse import unquote, urlparse
+
+
+@unique
+class ProbeResult(StrEnum):
+    OK = "OK"
+    CONNECT_FAILED = "CONNECT_FAILED"  # no TCP connection to the proxy host
+    HANDSHAKE_FAILED = "HANDSHAKE_FAILED"  # connected, but the proxy protocol handshake failed
+
+
+async def probe_proxy(url: str, target: tuple[str, int], timeout: float) -> ProbeResult:
+    """Cheap pre-check before the full IP-echo check: a TCP connect plus the SOCKS5 greeting/auth handshake,
+    or an HTTP CONNECT request to the target for http proxies. The tunnel is closed right after the handshake."""
+    parsed = urlparse(url)
+    if not parsed.hostname or not parsed.port:
+        return ProbeResult.CONNECT_FAILED
+    username = unquote(parsed.username) if parsed.username else None
+    password = unquote(parsed.password) if parsed.password else None
+
+    try:
+        async with asyncio.timeout(timeout):
+            reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port)
+    except (OSError, TimeoutError):
+        return ProbeResult.CONNECT_FAILED
+
+    try:
+        async with asyncio.timeout(timeout):
+            if parsed.scheme == "socks5":
+                ok = await socks5_handshake(reader, writer, username, password)
+            else:
+                ok = await http_connect_handshake(reader, writer, target, username, password)
+    except (OSError, TimeoutError, asyncio.IncompleteReadError, ValueError):
+        ok = False
+    finally:
+        writer.close()
+        with contextlib.suppress(OSError):
+            await writer.wait_closed()
+    return ProbeResult.OK if ok else ProbeResult.HANDSHAKE_FAILED
+
+
+async def socks5_handshake(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, username: str | None, password: str | None
+) -> bool:
+    """Greeting and username/password auth (RFC 1928, RFC 1929). No CONNECT command is sent."""
+    methods = b"\x00\x02" if username is not None else b"\x00"
+    writer.write(b"\x05" + bytes([len(methods)]) + methods)
+    await writer.drain()
+    version, method = await reader.readexactly(2)
+    if version != 5 or method not in methods:
+        return False
+    if method == 0x02:
+        user, pwd = (username or "").encode(), (password or "").encode()
+        writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+        await writer.drain()
+        _, status = await reader.readexactly(2)
+        return status == 0
+    return True
+
+
+async def http_connect_handshake(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    target: tuple[str, int],
+    username: str | None,
+    password: str | None,
+) -> bool:
+    host = f"{target[0]}:{target[1]}"
+    request = f"CONNECT {host} HTTP/1.1\r\nHost: {host}\r\n"
+    if username is not None:
+        credentials = base64.b64encode(f"{username}:{password or ''}".encode()).decode()
+        request += f"Proxy-Authorization: Basic {credentials}\r\n"
+    writer.write((request + "\r\n").encode())
+    await writer.drain()
+    status_line = await reader.readline()  # HTTP/1.1 200 Connection established
+    parts = status_line.decode(errors="replace").split()
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        return False
+    # any sane answer means a live proxy, except auth errors and gateway failures
+    status = int(parts[1])
+    return status != 407 and status < 500
@@ -0,0 +1,55 @@
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+class CheckerProcesses:
+    """Checker worker processes (app.worker) spawned by the main process.
+
+    Each one runs its own event loop and checks its partition of the proxies, so checks use all cores of the host.
+    Exited processes are restarted, a changed count restarts all of them with the new partitioning.
+    """
+
+    STOP_TIMEOUT = 10  # seconds to flush and release leases before the process is killed
+
+    def __init__(self) -> None:
+        self.processes: list[asyncio.subprocess.Process] = []
+
+    def __len__(self) -> int:
+        return len(self.processes)
+
+    async def ensure(self, count: int) -> None:
+        count = max(count, 0)
+        if count != len(self.processes):
+            await self.stop()
+            self.processes = [await self._spawn(i, count) for i in range(count)]
+            if count:
+                logger.info("checker processes started: %d", count)
+            return
+        for i, process in enumerate(self.processes):
+            if process.returncode is not None:
+                logger.warning("checker process %d/%d exited with %d, restarting", i, count, process.returncode)
+                self.processes[i] = await self._spawn(i, count)
+
+    async def stop(self) -> None:
+        for process in self.processes:
+            if process.returncode is None:
+                process.terminate()
+        for process in self.processes:
+            try:
+                await asyncio.wait_for(process.wait(), self.STOP_TIMEOUT)
+            except TimeoutError:
+                with contextlib.suppress(ProcessLookupError):
+                    process.kill()
+                await process.wait()
+        self.processes = []
+
+    @staticmethod
+    async def _spawn(index: int, count: int) -> asyncio.subprocess.Process:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.worker", "--partition", f"{index}/{count}", "--parent-pid", str(os.getpid())
+        )
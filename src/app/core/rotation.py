@@ -0,0 +1,114 @@
+import bisect
+import heapq
+import itertools
+import random
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+from enum import StrEnum, unique
+
+from app.core.db import Protocol
+from app.core.live import LiveGroup, LiveIndex, LiveProxy, hash64
+
+RING_SIZE = 1 << 64
+MAX_CURSORS = 1024  # round-robin positions kept, the least recently used filters are forgotten
+
+CursorKey = tuple[tuple[str, ...] | None, Protocol | None]  # (sources, protocol)
+
+
+@unique
+class RotationStrategy(StrEnum):
+    ROUND_ROBIN = "round_robin"
+    WEIGHTED = "weighted"  # weighted random by success rate
+    STICKY = "sticky"  # consistent hashing on a client-supplied key
+
+
+class Rotator:
+    """Hands out live proxies one (or K) at a time, straight from the live index groups.
+
+    Costs don't depend on the number of proxies: round-robin is O(groups), weighted random is O(groups)
+    plus expected O(1) rejection sampling, sticky is O(groups * log n) on the lazily built hash rings.
+    The groups are updated in place as checks complete, so the rotation follows the live set incrementally.
+    """
+
+    def __init__(self, live: LiveIndex) -> None:
+        self.live = live
+        self.cursors: OrderedDict[CursorKey, int] = OrderedDict()  # round-robin position per filter, LRU order
+
+    def next(
+        self,
+        cutoff: datetime,
+        strategy: RotationStrategy,
+        count: int = 1,
+        sources: tuple[str, ...] | None = None,
+        protocol: Protocol | None = None,
+        unique_ip: bool = False,
+        key: str | None = None,
+    ) -> list[LiveProxy]:
+        """Up to `count` distinct live proxies. With unique_ip, they all have different proxy_ip."""
+        groups = self.live.groups(sources, protocol)
+        total = sum(len(g) for g in groups)
+        if total == 0:
+            return []
+
+        if strategy == RotationStrategy.ROUND_ROBIN:
+            candidates = self._round_robin(groups, total, (sources, protocol))
+        elif strategy == RotationStrategy.WEIGHTED:
+            candidates = self._weighted(groups)
+        else:
+            candidates = self._sticky(groups, key or "")
+
+        res: list[LiveProxy] = []
+        urls: set[str] = set()
+        ips: set[str] = set()
+        # stale or repeated candidates are skipped, the number of attempts is bounded
+        attempts = count * 16 if strategy == RotationStrategy.WEIGHTED else min(total, count * 4 + 16)
+        for p in itertools.islice(candidates, attempts):
+            if p.last_ok_at <= cutoff or p.url in urls or (unique_ip and p.proxy_ip and p.proxy_ip in ips):
+                continue
+            res.append(p)
+            urls.add(p.url)
+            if p.proxy_ip:
+                ips.add(p.proxy_ip)
+            if len(res) >= count:
+                break
+        return res
+
+    def _round_robin(self, groups: list[LiveGroup], total: int, cursor_key: CursorKey) -> Iterator[LiveProxy]:
+        while True:
+            position = self.cursors.get(cursor_key, 0)
+            self.cursors[cursor_key] = position + 1
+            self.cursors.move_to_end(cursor_key)
+            if len(self.cursors) > MAX_CURSORS:  # filters come from clients, keep the dict bounded
+                self.cursors.popitem(last=False)
+            index = position % total
+            for group in groups:
+                if index < len(group):
+                    yield group.items[index]
+                    break
+                index -= len(group)
+
+    @staticmethod
+    def _weighted(groups: list[LiveGroup]) -> Iterator[LiveProxy]:
+        # uniform pick over all proxies, accepted with probability = success rate (rejection sampling)
+        sizes = [len(g) for g in groups]
+        while True:
+            group = random.choices(groups, weights=sizes)[0]
+            proxy = group.items[random.randrange(len(group))]
+            if random.random() < max(proxy.success_rate, 0.01):
+                yield proxy
+
+    @staticmethod
+    def _sticky(groups: list[LiveGroup], key: str) -> Iterator[LiveProxy]:
+        # walk every group's ring clockwise from the key's point, nearest proxies first
+        point = hash64(key)
+
+        def walk(group: LiveGroup) -> Iterator[tuple[int, LiveProxy]]:
+            hashes, proxies = group.ring()
+            start = bisect.bisect_left(hashes, point)
+            for i in range(len(proxies)):
+                j = (start + i) % len(proxies)
+                yield (hashes[j] - point) % RING_SIZE, proxies[j]
+
+        for _, proxy in heapq.merge(*(walk(g) for g in groups), key=lambda x: x[0]):
+            yield proxy
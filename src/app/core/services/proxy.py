@@ -1,32 +1,134 @@
-import asyncio
-import contextlib
 import logging
+import time
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
 
-import pydash
 from bson import ObjectId
 from mm_base6 import Service
 from mm_concurrency import async_synchronized
 from mm_http import http_request
 from mm_mongo import MongoUpdateResult
 from mm_std import utc_delta, utc_now
+from pydantic import BaseModel
+from pymongo import UpdateOne
 
-from app.core.db import Protocol, Proxy, Status
+from app.core.breaker import CircuitBreaker, CircuitState
+from app.core.bulk import BulkWriteBuffer
+from app.core.checker import CheckPool
+from app.core.db import (
+    NEW_PROXY_CHECK_AT,
+    PROXY_TTL,
+    CheckerHeartbeat,
+    CheckHistory,
+    Protocol,
+    Proxy,
+    Status,
+    lease_free,
+    partition_query,
+)
+from app.core.echo import EchoChecker
+from app.core.fair import FairScheduler, SourceShare
+from app.core.feed import LiveEventType, event_id, sse_message
+from app.core.gateway import ProxyGateway
+from app.core.listing import ProxyListing, ProxySort
+from app.core.live import LiveIndex, LiveProxy, LiveQuery
+from app.core.metrics import Metrics, merge_snapshots, render_prometheus
+from app.core.probe import ProbeResult, probe_proxy
+from app.core.processes import CheckerProcesses
+from app.core.rotation import RotationStrategy, Rotator
+from app.core.snapshot import LiveSnapshot, LiveSnapshotCache
+from app.core.tombstone import TombstoneStore
 from app.core.types import AppCore
-from app.core.utils import AsyncSlidingWindowCounter
+from app.core.utils import WORKER_ID, AsyncTTLCache
 
 logger = logging.getLogger(__name__)
 
+LATENCY_EWMA_ALPHA = 0.3  # weight of the newest latency sample
+BREAKER_PROBE_TIMEOUT = 1.5  # seconds, handshake after a failed echo check when the pre-check is disabled
+HEARTBEAT_TTL = timedelta(seconds=30)
+LIVE_STREAM_KEEPALIVE = 15  # seconds, a comment line keeps idle SSE connections open through proxies
+LIVE_SYNC_OVERLAP = timedelta(seconds=10)  # check results reach Mongo with the next bulk flush, a bit after checked_at
+
+
+class SourceThroughput(BaseModel):
+    checks_per_minute: float  # average of the last 5 minutes
+    ok_ratio: float | None  # share of ok checks in the last hour
+
+
+class ReaperStats(BaseModel):
+    runs: int = 0
+    deleted_total: int = 0
+    last_deleted: int = 0
+    last_run_at: datetime | None = None
+    last_seconds: float = 0
+    expired: int = 0  # past expires_at right now, filled by get_reaper_stats
+
 
 class ProxyService(Service[AppCore]):
     def __init__(self) -> None:
         super().__init__()
-        self.counter = AsyncSlidingWindowCounter(window_seconds=60)  # how many proxy checks per minute
+        self.metrics = Metrics()
+        self.live = LiveIndex()
+        self.rotator = Rotator(self.live)
+        self.snapshots = LiveSnapshotCache()
+        self.fair = FairScheduler()
+        self.source_shares = AsyncTTLCache(self.load_source_shares, ttl=10)
+        self.pool = CheckPool(self.claim_due_proxies, self.check_proxy, self.metrics.checks)
+        self.writer: BulkWriteBuffer  # check results, it's created on startup
+        self.echo = EchoChecker()
+        self.breaker = CircuitBreaker()  # keyed by proxy host and by endpoint
+        self.tombstones = TombstoneStore()
+        self.live_synced_at = utc_now()
+        self.reaper_stats = ReaperStats()
+        self.partition: tuple[int, int] | None = None  # (index, count), set in spawned checker processes
+        self.processes = CheckerProcesses()  # spawned by the main process, see the checker_processes setting
+        self.gateway = ProxyGateway(self.pick_upstream, self.report_upstream_failure)  # see supervise_gateway
 
     async def on_startup(self) -> None:
+        self.start_writer()
+        self.configure_echo()
+        await self.migrate_check_history()
+        await self.migrate_next_check_at()
+        await self.migrate_host()
+        await self.migrate_expires_at()
+        await self.tombstones.load(self.core.db.proxy_tombstone)
+        await self.core.db.checker_heartbeat.collection.create_index("expires_at", expireAfterSeconds=0)
+        await self.refresh_own_ip()
+        await self.rebuild_live_index()
+
+    async def start_checker(self, partition: tuple[int, int] | None) -> None:
+        """Startup of a checker-only process (app.worker): the check pool and its heartbeat, driven by the worker loop.
+        Migrations, the live index and the scheduled jobs stay with the main process."""
+        self.partition = partition
+        self.start_writer()
+        self.configure_echo()
         await self.refresh_own_ip()
 
+    def start_writer(self) -> None:
+        self.writer = BulkWriteBuffer(
+            self.core.db.proxy.collection, on_flush=lambda seconds: self.metrics.observe_mongo("bulk_write", seconds)
+        )
+        self.writer.start()
+
+    async def on_shutdown(self) -> None:
+        await self.gateway.stop()
+        await self.processes.stop()
+        await self.pool.stop()
+        await self.writer.stop()
+
     def configure_scheduler(self) -> None:
-        self.core.scheduler.add_task("proxy_check", 1, self.core.services.proxy.check_next)
+        self.core.scheduler.add_task("proxy_check", 1, self.core.services.proxy.supervise_check_pool)
+        self.core.scheduler.add_task("live_expire", 10, self.core.services.proxy.expire_live_index)
+        self.core.scheduler.add_task("live_sync", 5, self.core.services.proxy.sync_live_index)
+        self.core.scheduler.add_task("tombstone_reload", 600, self.core.services.proxy.reload_tombstones)
+        self.core.scheduler.add_task("gateway", 5, self.core.services.proxy.supervise_gateway)
+        self.core.scheduler.add_task("gateway_pool_prune", 10, self.core.services.proxy.prune_gateway_pool)
+        self.core.scheduler.add_task("checker_heartbeat", 5, self.core.services.proxy.publish_heartbeat)
+        self.core.scheduler.add_task("proxy_reaper", 60, self.core.services.proxy.reap_expired_proxies)
+
+    def configure_echo(self) -> None:
+        self.echo.configure(self.core.settings.proxy_echo_urls, self.core.settings.proxy_echo_hedge_quantile)
 
     async def refresh_own_ip(self) -> str | None:
         res = await http_request("https://api.ipify.org/?format=json", timeout=10)
@@ -37,15 +139,42 @@ class ProxyService(Service[AppCore]):
         return ip
 
     async def check(self, id: ObjectId) -> dict[str, object]:
-        proxy = await self.core.db.proxy.get(id)
+        res = await self.check_proxy(await self.core.db.proxy.get(id))
+        await self.writer.flush()
+        return res
+
+    async def check_proxy(self, proxy: Proxy) -> dict[str, object]:
+        """Check the proxy and buffer the result, the write goes to Mongo with the next bulk flush."""
         logger.debug("check proxy", extra={"id": proxy.id, "url": proxy.url})
+        check_started_at = time.monotonic()
 
-        response_ip = await get_proxy_response_ip(proxy.url, self.core.settings.proxy_check_timeout)
+        probe: ProbeResult | None = None  # None: not probed
+        # both are asked, so an expired half-open trial of either circuit is renewed
+        allowed = [self.breaker.allow(proxy.host), self.breaker.allow(proxy.endpoint)]
+        if not all(allowed):
+            probe = ProbeResult.CONNECT_FAILED  # the host is known to be down, don't wait for a timeout
+        elif self.core.settings.proxy_precheck_timeout > 0:
+            # cheap handshake tier first, most ingested proxies are dead and fail here fast
+            probe = await probe_proxy(proxy.url, self.echo.target(), self.core.settings.proxy_precheck_timeout)
+            await self.record_connect(proxy, probe != ProbeResult.CONNECT_FAILED)
+        response_ip = None
+        started_at = time.monotonic()
+        if probe in (None, ProbeResult.OK):
+            response_ip = await self.echo.get_ip(proxy.url, self.core.settings.proxy_check_timeout)
+        latency_ms = (time.monotonic() - started_at) * 1000
+        if probe is None:
+            if response_ip:
+                probe = ProbeResult.OK
+                await self.record_connect(proxy, True)
+            else:
+                # the echo check doesn't tell a dead host from a bad proxy, a handshake does
+                probe = await probe_proxy(proxy.url, self.echo.target(), BREAKER_PROBE_TIMEOUT)
+                await self.record_connect(proxy, probe != ProbeResult.CONNECT_FAILED)
         # Validate: must have response and not be our own IP (means proxy not working)
         proxy_ip = response_ip if response_ip and response_ip != self.core.state.own_ip else None
         success = proxy_ip is not None
-
-        await self.counter.record_operation()
+        outcome = "ok" if success else ("no_ip" if probe == ProbeResult.OK else probe.lower())
+        self.metrics.record_check(proxy.source, proxy.protocol, outcome, time.monotonic() - check_started_at)
 
         status = Status.OK if success else Status.DOWN
         updated: dict[str, object] = {"status": status, "checked_at": utc_now()}
@@ -53,86 +182,398 @@ class ProxyService(Service[AppCore]):
             updated["last_ok_at"] = utc_now()
             if proxy_ip:
                 updated["proxy_ip"] = proxy_ip
-        updated["check_history"] = ([success, *proxy.check_history])[:100]
+            updated["latency_ms"] = round(ewma(proxy.latency_ms, latency_ms, LATENCY_EWMA_ALPHA), 1)
+
+        checked_proxy = proxy.model_copy(update={**updated, "history": proxy.history.push(success)})
+        checked_proxy.next_check_at = self.calc_next_check_at(checked_proxy)
+        updated["next_check_at"] = checked_proxy.next_check_at
+        updated |= {"lease_owner": None, "lease_until": None}
+        if success:
+            updated["expires_at"] = checked_proxy.calc_expires_at()  # down proxies are deleted by the reaper
+        # pipeline update, so the history bitmap is shifted atomically in Mongo
+        fields = {k: {"$literal": v} for k, v in updated.items()} | CheckHistory.push_update(success)
+        await self.writer.add(proxy.id, UpdateOne({"_id": proxy.id}, [{"$set": fields}]))
 
-        updated_proxy = await self.core.db.proxy.set_and_get(id, updated)
-        if updated_proxy.is_time_to_delete():
-            await self.core.db.proxy.delete(id)
-            updated["deleted"] = True
+        live_proxy = LiveProxy.from_proxy(checked_proxy) if success else None
+        if live_proxy:
+            self.live.upsert(live_proxy)
+        else:
+            self.live.discard(proxy.url)
 
         return updated
 
+    async def reap_expired_proxies(self) -> int:
+        """Delete proxies past their expires_at in batches over the expires_at index, and tombstone their urls.
+
+        A TTL index would delete them as well, but without the tombstones.
+        """
+        if self.partition is not None:
+            return 0  # the main process reaps for everyone
+        started_at = time.monotonic()
+        now = utc_now()
+        batch_size = self.core.settings.proxy_reap_batch_size
+        unwritten = list(self.writer.pending_ids())  # a buffered check result may move expires_at
+        query = {"expires_at": {"$lte": now}, "_id": {"$nin": unwritten}} | lease_free(now)
+        collection = self.core.db.proxy.collection
+        deleted = 0
+        while True:
+            with self.metrics.mongo_timer("reap"):
+                docs = await collection.find(query, {"url": 1}).sort("expires_at", 1).limit(batch_size).to_list()
+                if not docs:
+                    break
+                ids = [d["_id"] for d in docs]
+                res = await collection.delete_many({"_id": {"$in": ids}, "expires_at": {"$lte": now}})
+                if res.deleted_count < len(ids):  # some were checked ok in between, they stay
+                    kept = {d["_id"] for d in await collection.find({"_id": {"$in": ids}}, {"_id": 1}).to_list()}
+                    docs = [d for d in docs if d["_id"] not in kept]
+            urls = [d["url"] for d in docs]
+            await self.bury(urls)
+            for url in urls:
+                self.live.discard(url)
+            deleted += res.deleted_count
+            if len(ids) < batch_size:
+                break
+
+        stats = self.reaper_stats
+        stats.runs += 1
+        stats.deleted_total += deleted
+        stats.last_deleted = deleted
+        stats.last_run_at = now
+        stats.last_seconds = round(time.monotonic() - started_at, 3)
+        if deleted:
+            logger.info("expired proxies deleted: %d", deleted)
+        return deleted
+
+    async def get_reaper_stats(self) -> ReaperStats:
+        expired = await self.core.db.proxy.collection.count_documents({"expires_at": {"$lte": utc_now()}})
+        return self.reaper_stats.model_copy(update={"expired": expired})
+
+    async def bury(self, urls: list[str]) -> None:
+        """Tombstone urls deleted as dead, so sources don't re-ingest them for a while."""
+        ops = []
+        for url in urls:
+            t = self.tombstones.bury(url)
+            update = {"strikes": t.strikes, "blocked_until": t.blocked_until, "expires_at": t.expires_at}
+            ops.append(UpdateOne({"_id": url}, {"$set": update}, upsert=True))
+        if ops:
+            await self.core.db.proxy_tombstone.collection.bulk_write(ops, ordered=False)
+
+    async def record_connect(self, proxy: Proxy, connected: bool) -> None:
+        """Feed a connection attempt to the host and endpoint circuits."""
+        for key in (proxy.host, proxy.endpoint):
+            state = self.breaker.record(key, connected)
+            if state is not None:
+                await self.on_circuit_change(proxy, key, state)
+
+    async def on_circuit_change(self, proxy: Proxy, key: str, state: CircuitState) -> None:
+        """An open circuit marks all proxies of the host (or endpoint) down in bulk, they are retried after the cooldown.
+        A closed one makes them due right away."""
+        port = urlparse(proxy.url).port if key != proxy.host else None  # None: the whole host
+        query: dict[str, object] = {"host": proxy.host}
+        if port is not None:
+            query["url"] = {"$regex": f":{port}$"}
+        now = utc_now()
+        if state == CircuitState.OPEN:
+            logger.info("circuit open: %s", key)
+            await self.writer.flush()
+            updated = {"status": Status.DOWN, "checked_at": now}
+            fields = {k: {"$literal": v} for k, v in updated.items()} | CheckHistory.push_update(False)
+            # not before the cooldown, and never earlier than a longer backoff the proxy already has
+            retry_at = now + timedelta(seconds=self.breaker.cooldown)
+            fields["next_check_at"] = {"$max": ["$next_check_at", {"$literal": retry_at}]}
+            await self.core.db.proxy.collection.update_many(query, [{"$set": fields}])
+
+            def affected(p: LiveProxy) -> bool:
+                parsed = urlparse(p.url)
+                return parsed.hostname == proxy.host and (port is None or parsed.port == port)
+
+            self.live.discard_if(affected)
+        else:
+            logger.info("circuit closed: %s", key)
+            await self.core.db.proxy.update_many(query | {"status": Status.DOWN}, {"$set": {"next_check_at": now}})
+
     @async_synchronized
-    async def check_next(self) -> None:
-        if not self.core.settings.proxies_check:
+    async def supervise_check_pool(self) -> None:
+        """Main process: checks in this process, or in spawned checker processes (checker_processes setting)."""
+        self.apply_settings()
+        await self.processes.ensure(self.core.settings.checker_processes if self.core.settings.proxies_check else 0)
+        if self.core.settings.proxies_check and not self.processes:
+            await self.pool.start(self.core.settings.proxies_check_concurrency)
+        else:
+            await self.pool.stop()
+
+    async def supervise_checker(self) -> None:
+        """Checker-only process: runs the check pool, never spawns processes."""
+        self.apply_settings()
+        if self.core.settings.proxies_check:
+            await self.pool.start(self.core.settings.proxies_check_concurrency)
+        else:
+            await self.pool.stop()
+
+    def apply_settings(self) -> None:
+        self.writer.batch_size = self.core.settings.proxy_write_batch_size
+        self.writer.flush_interval = self.core.settings.proxy_write_flush_ms / 1000
+        self.configure_echo()
+        self.breaker.threshold = self.core.settings.breaker_failure_threshold
+        self.breaker.cooldown = self.core.settings.breaker_cooldown_seconds
+        self.tombstones.base_hours = self.core.settings.tombstone_base_hours
+        self.tombstones.max_hours = self.core.settings.tombstone_max_hours
+        self.gateway.retries = self.core.settings.gateway_retries
+        self.gateway.connect_timeout = self.core.settings.gateway_connect_timeout
+        self.gateway.pool.size = self.core.settings.gateway_pool_size
+
+    async def publish_heartbeat(self) -> None:
+        """Publish the check pool counters, so the main process can show all checker processes."""
+        if not self.pool.running:
             return
-        limit = self.core.settings.max_proxies_check
-        proxies = await self.core.db.proxy.find({"checked_at": None}, limit=limit)
-        if len(proxies) < limit:
-            proxies += await self.core.db.proxy.find(
-                {"checked_at": {"$lt": utc_delta(minutes=-5)}}, "checked_at", limit=limit - len(proxies)
-            )
+        now = utc_now()
+        partition = f"{self.partition[0]}/{self.partition[1]}" if self.partition else None
+        heartbeat = self.pool.stats().model_dump() | {
+            "partition": partition,
+            "metrics": self.metrics.snapshot(),
+            "updated_at": now,
+            "expires_at": now + HEARTBEAT_TTL,
+        }
+        await self.core.db.checker_heartbeat.set(WORKER_ID, heartbeat, upsert=True)
 
-        async with asyncio.TaskGroup() as tg:
-            for proxy in proxies:
-                tg.create_task(self.check(proxy.id), name=f"check_proxy_{proxy.id}")
+    async def get_heartbeats(self) -> list[CheckerHeartbeat]:
+        return await self.core.db.checker_heartbeat.find({"updated_at": {"$gt": utc_now() - HEARTBEAT_TTL}}, "partition")
 
-    async def get_live_proxies(
-        self, sources: list[str] | None, protocol: Protocol | None = None, unique_ip: bool = False
-    ) -> list[Proxy]:
-        query = {
-            "status": Status.OK,
-            "last_ok_at": {"$gt": utc_delta(minutes=-1 * self.core.settings.live_last_ok_minutes)},
+    async def render_metrics(self) -> str:
+        """Prometheus metrics of this process, merged with the ones published by other checker processes."""
+        others = [h for h in await self.get_heartbeats() if h.id != WORKER_ID]
+        snapshot = merge_snapshots([self.metrics.snapshot(), *(h.metrics for h in others)])
+        stats = self.pool.stats()
+        gauges = {
+            "queue_depth": stats.queue_depth + sum(h.queue_depth for h in others),
+            "in_flight": stats.in_flight + sum(h.in_flight for h in others),
+            "scheduler_lag_seconds": await self.calc_scheduler_lag(),
+            "live_proxies": len(self.live),
+            "open_circuits": len(self.breaker.open_keys()),
+            "gateway_connections": self.gateway.stats.connections,
         }
-        if sources:
-            query["source"] = {"$in": sources}
-        if protocol:
-            query["protocol"] = protocol.value
-        proxies = await self.core.db.proxy.find(query, "url")
-        if unique_ip:
-            with_ip = [p for p in proxies if p.proxy_ip]
-            without_ip = [p for p in proxies if not p.proxy_ip]
-            unique_with_ip = pydash.uniq_by(with_ip, lambda p: p.proxy_ip)
-            proxies = unique_with_ip + without_ip
-        return proxies
+        return render_prometheus(snapshot, gauges)
 
-    async def reset_all_proxies_status(self) -> MongoUpdateResult:
-        return await self.core.db.proxy.update_many(
-            {}, {"$set": {"status": Status.UNKNOWN, "checked_at": None, "last_ok_at": None}}
+    async def calc_source_throughput(self) -> dict[str, SourceThroughput]:
+        """Checks per source of all checker processes."""
+        others = [h for h in await self.get_heartbeats() if h.id != WORKER_ID]
+        sources = merge_snapshots([self.metrics.snapshot(), *(h.metrics for h in others)])["sources"]
+        return {
+            source: SourceThroughput(
+                checks_per_minute=round(c["all_5m"] / 5, 1), ok_ratio=round(c["ok"] / c["all"], 3) if c["all"] else None
+            )
+            for source, c in sources.items()
+        }
+
+    async def calc_scheduler_lag(self) -> float:
+        """How long the most overdue proxy has been waiting for its check, seconds."""
+        now = utc_now()
+        with self.metrics.mongo_timer("scheduler_lag"):
+            oldest = await self.core.db.proxy.find({"next_check_at": {"$lte": now}}, "next_check_at", limit=1)
+        if not oldest:
+            return 0.0
+        due_at = oldest[0].created_at if oldest[0].next_check_at == NEW_PROXY_CHECK_AT else oldest[0].next_check_at
+        return max((now - due_at).total_seconds(), 0.0)
+
+    async def claim_due_proxies(self, limit: int) -> list[Proxy]:
+        """Lease up to `limit` due proxies to this worker, so other processes and nodes don't check them too.
+        The lease is released with the buffered check result, or expires if the worker dies.
+        The capacity is shared between sources by their weights, see FairScheduler."""
+        shares = await self.source_shares.get()
+        if self.partition:  # every partition has its part of each source
+            count = self.partition[1]
+            shares = {s: SourceShare(share.weight, share.min_per_minute / count) for s, share in shares.items()}
+        with self.metrics.mongo_timer("claim_due"):
+            return await self.fair.claim(limit, shares, self.claim_due_source_proxies)
+
+    async def claim_due_source_proxies(self, source: str, limit: int) -> list[Proxy]:
+        now = utc_now()
+        query = {"source": source, "next_check_at": {"$lte": now}} | lease_free(now)
+        if self.partition:
+            query |= partition_query(*self.partition)
+        candidates = await self.core.db.proxy.find(query, "next_check_at", limit=limit)
+        if not candidates:
+            return []
+        ids = [p.id for p in candidates]
+        lease = {"lease_owner": WORKER_ID, "lease_until": now + timedelta(seconds=self.core.settings.proxy_lease_seconds)}
+        # another worker may have claimed some of them in between, the lease condition skips those
+        await self.core.db.proxy.update_many({"_id": {"$in": ids}} | query, {"$set": lease})
+        return await self.core.db.proxy.find({"_id": {"$in": ids}, "lease_owner": WORKER_ID}, "next_check_at")
+
+    async def load_source_shares(self) -> dict[str, SourceShare]:
+        fields = {"weight": 1, "min_checks_per_minute": 1}
+        docs = await self.core.db.source.collection.find({}, fields).to_list()
+        return {d["_id"]: SourceShare(d.get("weight", 1.0), d.get("min_checks_per_minute", 0)) for d in docs}
+
+    def calc_next_check_at(self, proxy: Proxy) -> datetime:
+        """Live proxies are rechecked just before they fall out of the live window,
+        failing ones back off exponentially with the number of down checks in a row."""
+        settings = self.core.settings
+        if proxy.status == Status.OK and proxy.last_ok_at:
+            recheck_in = max(settings.live_last_ok_minutes * 60 - settings.proxy_recheck_lead_seconds, 30)
+            return proxy.last_ok_at + timedelta(seconds=recheck_in)
+        downs = max(proxy.history.consecutive_down(), 1)
+        backoff = min(settings.proxy_backoff_base_seconds * 2 ** min(downs - 1, 20), settings.proxy_backoff_max_minutes * 60)
+        return utc_now() + timedelta(seconds=backoff)
+
+    def list_proxies(
+        self, query: dict[str, object], sort: ProxySort, descending: bool, limit: int, cursor: str | None = None
+    ) -> ProxyListing:
+        """A page of proxies for the UI and the API listing. Raises ValueError for a malformed cursor."""
+        return ProxyListing(self.core.db.proxy.collection, query, sort, descending, limit, cursor)
+
+    def get_live_proxies(self, q: LiveQuery) -> list[LiveProxy]:
+        return self.live.query(self.live_cutoff(), q)
+
+    def get_live_snapshot(self, q: LiveQuery, format_: str) -> LiveSnapshot:
+        """Serialized live proxy urls, cached until the live set changes. Proxies aging out of the live window
+        leave the cached responses with the next expiry run, at most 10 seconds later."""
+        return self.snapshots.get(q, format_, self.live.version, lambda: [p.url for p in self.get_live_proxies(q)])
+
+    def next_proxies(
+        self,
+        strategy: RotationStrategy,
+        count: int = 1,
+        sources: list[str] | None = None,
+        protocol: Protocol | None = None,
+        unique_ip: bool = False,
+        key: str | None = None,
+    ) -> list[LiveProxy]:
+        return self.rotator.next(
+            self.live_cutoff(), strategy, count, tuple(sources) if sources else None, protocol, unique_ip, key
+        )
+
+    def pick_upstream(self, exclude: set[str]) -> LiveProxy | None:
+        """Next gateway upstream, round-robin over the live set."""
+        proxies = self.rotator.next(self.live_cutoff(), RotationStrategy.ROUND_ROBIN, len(exclude) + 1)
+        return next((p for p in proxies if p.url not in exclude), None)
+
+    async def report_upstream_failure(self, url: str) -> None:
+        """The gateway could not connect through the proxy: it's down until the checker says otherwise."""
+        self.live.discard(url)
+        await self.core.db.proxy.collection.update_one(
+            {"url": url, "status": Status.OK}, {"$set": {"status": Status.DOWN, "next_check_at": utc_now()}}
         )
 
+    async def supervise_gateway(self) -> None:
+        """Main process: start, move or stop the gateway listener as the gateway settings change."""
+        settings = self.core.settings
+        self.gateway.credentials = (settings.gateway_username, settings.gateway_password) if settings.gateway_password else None
+        self.gateway.handshake_timeout = settings.gateway_handshake_timeout
+        await self.gateway.listen((settings.gateway_host, settings.gateway_port) if settings.gateway_enabled else None)
+
+    async def prune_gateway_pool(self) -> None:
+        self.gateway.pool.prune()
+
+    async def stream_live(
+        self, sources: tuple[str, ...] | None, protocol: Protocol | None, last_event_id: str | None = None
+    ) -> AsyncIterator[str]:
+        """Server-Sent Events of the live set: a snapshot, then `added`/`removed` events as proxies enter and leave it.
+
+        A client reconnecting with its last event id gets only the events it missed, as long as they are still buffered;
+        otherwise, after an index rebuild, and with an id from before a restart, it gets a new snapshot.
+        """
+        feed = self.live.feed
+
+        def snapshot() -> str:
+            proxies = self.live.query(self.live_cutoff(), LiveQuery(sources=sources, protocol=protocol))
+            return sse_message("snapshot", {"proxies": [p.url for p in proxies]}, event_id(feed.epoch, feed.seq))
+
+        seq = feed.parse_event_id(last_event_id) if last_event_id is not None else None
+        if seq is None or feed.since(seq) is None:
+            seq = feed.seq
+            yield snapshot()
+        while True:
+            events = feed.since(seq)
+            if events is None:  # the client fell behind the buffer
+                seq = feed.seq
+                yield snapshot()
+                continue
+            for event in events:
+                if event.type == LiveEventType.RESET:
+                    seq = feed.seq
+                    yield snapshot()
+                    break
+                seq = event.seq
+                if event.matches(sources, protocol):
+                    yield event.to_sse(feed.epoch)
+            if not await feed.wait(seq, LIVE_STREAM_KEEPALIVE):
+                yield ": keepalive\n\n"
+
+    def live_cutoff(self) -> datetime:
+        return utc_delta(minutes=-1 * self.core.settings.live_last_ok_minutes)
+
+    async def rebuild_live_index(self) -> int:
+        self.live_synced_at = utc_now()
+        proxies = await self.core.db.proxy.find({"status": Status.OK, "last_ok_at": {"$gt": self.live_cutoff()}})
+        self.live.rebuild(p for p in map(LiveProxy.from_proxy, proxies) if p)
+        logger.info("live index rebuilt: %d proxies", len(self.live))
+        return len(self.live)
+
+    async def sync_live_index(self) -> int:
+        """Apply check results written since the last sync, including the ones of other workers."""
+        since, self.live_synced_at = self.live_synced_at - LIVE_SYNC_OVERLAP, utc_now()
+        cutoff = self.live_cutoff()
+        unwritten = self.writer.pending_ids()  # Mongo has an older state of them than the live index
+        with self.metrics.mongo_timer("live_sync"):
+            proxies = await self.core.db.proxy.find({"checked_at": {"$gte": since}})
+        for proxy in proxies:
+            if proxy.id in unwritten:
+                continue
+            live_proxy = LiveProxy.from_proxy(proxy) if proxy.status == Status.OK else None
+            if live_proxy and live_proxy.last_ok_at > cutoff:
+                self.live.upsert(live_proxy)
+            else:
+                self.live.discard(proxy.url)
+        return len(proxies)
+
+    async def expire_live_index(self) -> None:
+        self.live.expire(self.live_cutoff())
+
+    async def reload_tombstones(self) -> None:
+        # other processes bury urls too, the TTL index has already dropped the expired ones
+        await self.tombstones.load(self.core.db.proxy_tombstone)
+
+    async def migrate_check_history(self) -> int:
+        res = await self.core.db.proxy.collection.update_many({"check_history": {"$exists": True}}, CheckHistory.migrate_update())
+        if res.modified_count:
+            logger.info("check_history migrated to bitmap history: %d proxies", res.modified_count)
+        return res.modified_count
+
+    async def migrate_next_check_at(self) -> int:
+        # proxies created before the adaptive scheduler: due right away, never checked ones first
+        res = await self.core.db.proxy.collection.update_many(
+            {"next_check_at": {"$exists": False}}, [{"$set": {"next_check_at": {"$ifNull": ["$checked_at", NEW_PROXY_CHECK_AT]}}}]
+        )
+        if res.modified_count:
+            logger.info("next_check_at set: %d proxies", res.modified_count)
+        return res.modified_count
+
+    async def migrate_host(self) -> int:
+        match = {"$regexFind": {"input": "$url", "regex": r"^\w+://(?:[^@/]*@)?([^:/]+)"}}
+        host = {"$ifNull": [{"$arrayElemAt": [{"$getField": {"field": "captures", "input": match}}, 0]}, ""]}
+        res = await self.core.db.proxy.collection.update_many({"host": {"$exists": False}}, [{"$set": {"host": host}}])
+        if res.modified_count:
+            logger.info("host set: %d proxies", res.modified_count)
+        return res.modified_count
+
+    async def migrate_expires_at(self) -> int:
+        expires_at = {"$add": [{"$ifNull": ["$last_ok_at", "$created_at"]}, PROXY_TTL.total_seconds() * 1000]}
+        res = await self.core.db.proxy.collection.update_many(
+            {"expires_at": {"$exists": False}}, [{"$set": {"expires_at": expires_at}}]
+        )
+        if res.modified_count:
+            logger.info("expires_at set: %d proxies", res.modified_count)
+        return res.modified_count
+
+    async def reset_all_proxies_status(self) -> MongoUpdateResult:
+        await self.writer.flush()
+        reset = {"status": Status.UNKNOWN, "checked_at": None, "last_ok_at": None, "next_check_at": NEW_PROXY_CHECK_AT}
+        reset["expires_at"] = utc_now() + PROXY_TTL  # a full TTL, so they get checked before the reaper sees them
+        res = await self.core.db.proxy.update_many({}, {"$set": reset | {"lease_owner": None, "lease_until": None}})
+        self.live.rebuild([])
+        return res
+
 
-async def get_proxy_response_ip(proxy: str, timeout: float) -> str | None:
-    tasks = [
-        asyncio.create_task(httpbin_get_ip(proxy, timeout)),
-        asyncio.create_task(ipify_get_ip(proxy, timeout)),
-    ]
-    try:
-        for task in asyncio.as_completed(tasks):
-            result = await task
-            if result:
-                for t in tasks:
-                    if not t.done():
-                        t.cancel()
-                        with contextlib.suppress(asyncio.CancelledError):
-                            await t
-                return result
-        return None
-    finally:
-        for t in tasks:
-            if not t.done():
-                t.cancel()
-                with contextlib.suppress(asyncio.CancelledError):
-                    await t
-
-
-async def httpbin_get_ip(proxy: str, timeout: float) -> str | None:
-    res = await http_request("https://httpbin.org/ip", proxy=proxy, timeout=timeout)
-    ip: str | None = res.parse_json("origin", none_on_error=True)
-    return ip
-
-
-async def ipify_get_ip(proxy: str, timeout: float) -> str | None:
-    res = await http_request("https://api.ipify.org/?format=json", proxy=proxy, timeout=timeout)
-    ip: str | None = res.parse_json("ip", none_on_error=True)
-    return ip
+def ewma(previous: float | None, sample: float, alpha: float) -> float:
+    return sample if previous is None else alpha * sample + (1 - alpha) * previous
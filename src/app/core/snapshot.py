@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from collections.abc import Callable
+from compression import zstd
+from dataclasses import dataclass, field
+
+from app.core.live import LiveQuery, LiveSort
+
+SnapshotKey = tuple[LiveQuery, str]  # (query, format)
+
+
+ENCODINGS = ("zstd", "gzip")  # in order of preference
+
+
+@dataclass
+class LiveSnapshot:
+    """A serialized /live response. Compressed bodies are made on the first request for them."""
+
+    version: tuple[int, int]  # live index (membership, data) versions the body was built for
+    body: bytes
+    media_type: str
+    digest: str = ""
+    encoded: dict[str, bytes] = field(default_factory=dict)  # content-encoding -> body
+
+    def __post_init__(self) -> None:
+        # a content hash, so ETags stay valid across restarts and app instances
+        self.digest = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+
+    def etag(self, encoding: str | None) -> str:
+        """A strong ETag per encoding: the bodies differ byte for byte, caches must not mix them up."""
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def not_modified(self, if_none_match: str | None, encoding: str | None) -> bool:
+        """Whether the client has this body in this encoding, by the If-None-Match header (weak comparison)."""
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag(encoding) in tags
+
+    def encode(self, encoding: str | None) -> bytes:
+        if encoding is None:
+            return self.body
+        if encoding not in self.encoded:
+            self.encoded[encoding] = zstd.compress(self.body) if encoding == "zstd" else gzip.compress(self.body, 6)
+        return self.encoded[encoding]
+
+
+class LiveSnapshotCache:
+    """Serialized /live responses per (query, format), rebuilt only after the live index has changed.
+
+    Queries sorted or filtered by latency or ip depend on proxy data as well as on the membership,
+    the others are reused until a proxy enters or leaves the live set.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self.entries: OrderedDict[SnapshotKey, LiveSnapshot] = OrderedDict()  # LRU order
+
+    def get(self, q: LiveQuery, format_: str, version: tuple[int, int], build: Callable[[], list[str]]) -> LiveSnapshot:
+        if not depends_on_data(q):
+            version = (version[0], 0)
+        key = (q, format_)
+        snapshot = self.entries.get(key)
+        if snapshot is not None and snapshot.version == version:
+            self.entries.move_to_end(key)
+            return snapshot
+
+        urls = build()
+        if format_ == "text":
+            snapshot = LiveSnapshot(version, "\n".join(urls).encode(), "text/plain")
+        else:
+            snapshot = LiveSnapshot(version, json.dumps({"proxies": urls}, separators=(",", ":")).encode(), "application/json")
+        self.entries[key] = snapshot
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return snapshot
+
+
+def depends_on_data(q: LiveQuery) -> bool:
+    return q.sort != LiveSort.URL or q.unique_ip or q.max_latency_ms is not None
+
+
+def choose_encoding(accept_encoding: str) -> str | None:
+    """The best encoding the client accepts: zstd, gzip or none."""
+    accepted = {e.split(";")[0].strip().lower() for e in accept_encoding.split(",")}
+    return next((e for e in ENCODINGS if e in accepted), None)
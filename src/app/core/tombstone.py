@@ -0,0 +1,47 @@
+import logging
+from datetime import datetime, timedelta
+
+from mm_mongo import AsyncMongoCollection
+from mm_std import utc_now
+
+from app.core.db import ProxyTombstone
+
+logger = logging.getLogger(__name__)
+
+
+class TombstoneStore:
+    """Urls of proxies deleted as dead, kept in memory for ingestion lookups and persisted in Mongo.
+
+    Each deletion of the same url doubles its block time: base_hours * 2^(strikes-1), up to max_hours.
+    """
+
+    STRIKES_MEMORY = timedelta(days=7)  # documents outlive the block by this, to remember strikes
+
+    def __init__(self, base_hours: float = 6, max_hours: float = 168) -> None:
+        self.base_hours = base_hours
+        self.max_hours = max_hours
+        self.tombstones: dict[str, ProxyTombstone] = {}  # url -> tombstone
+
+    def __len__(self) -> int:
+        return len(self.tombstones)
+
+    async def load(self, collection: AsyncMongoCollection[str, ProxyTombstone]) -> None:
+        await collection.collection.create_index("expires_at", expireAfterSeconds=0)
+        self.tombstones = {t.id: t for t in await collection.find({})}
+        logger.info("tombstones loaded: %d", len(self.tombstones))
+
+    def is_blocked(self, url: str, now: datetime | None = None) -> bool:
+        tombstone = self.tombstones.get(url)
+        return tombstone is not None and tombstone.blocked_until > (now or utc_now())
+
+    def bury(self, url: str) -> ProxyTombstone:
+        """Register a deleted dead url. The caller persists the returned tombstone."""
+        now = utc_now()
+        previous = self.tombstones.get(url)
+        strikes = previous.strikes + 1 if previous and previous.expires_at > now else 1
+        hours = min(self.base_hours * 2 ** min(strikes - 1, 30), self.max_hours)
+        blocked_until = now + timedelta(hours=hours)
+        expires_at = blocked_until + self.STRIKES_MEMORY
+        tombstone = ProxyTombstone(id=url, strikes=strikes, blocked_until=blocked_until, expires_at=expires_at)
+        self.tombstones[url] = tombstone
+        return tombstone
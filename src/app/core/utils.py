@@ -1,26 +1,40 @@
 import asyncio
+import os
+import socket
 import time
-from collections import deque
-
-
-class AsyncSlidingWindowCounter:
-    def __init__(self, window_seconds: int) -> None:
-        self.window = window_seconds
-        self.timestamps: deque[float] = deque()
-        self.lock = asyncio.Lock()
-
-    async def record_operation(self) -> None:
-        now = time.monotonic()
-        async with self.lock:
-            self.timestamps.append(now)
-            self._cleanup(now)
-
-    def _cleanup(self, current_time: float) -> None:
-        while self.timestamps and self.timestamps[0] < current_time - self.window:
-            self.timestamps.popleft()
-
-    async def get_count(self) -> int:
-        now = time.monotonic()
-        async with self.lock:
-            self._cleanup(now)
-            return len(self.timestamps)
+from collections.abc import Awaitable, Callable
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"  # lease owner of this process
+
+
+class AsyncTTLCache[T]:
+    """Caches the result of an async function for `ttl` seconds.
+
+    Concurrent callers during a refresh share one in-flight computation (single-flight).
+    """
+
+    def __init__(self, func: Callable[[], Awaitable[T]], ttl: float) -> None:
+        self.func = func
+        self.ttl = ttl
+        self.value: T | None = None
+        self.expires_at = 0.0
+        self.task: asyncio.Task[T] | None = None
+
+    async def get(self) -> T:
+        if self.value is not None and time.monotonic() < self.expires_at:
+            return self.value
+        if self.task is None:
+            self.task = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self.task)
+
+    def invalidate(self) -> None:
+        self.expires_at = 0.0
+
+    async def _refresh(self) -> T:
+        try:
+            value = await self.func()
+            self.value = value
+            self.expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            self.task = None
@@ -1,3 +1,3 @@
-from . import proxy, source, ui
+from . import echo, metrics, proxy, source, ui
 
-__all__ = ["proxy", "source", "ui"]
+__all__ = ["echo", "metrics", "proxy", "source", "ui"]
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request
+from mm_base6 import cbv
+
+from app.core.echo import forwarded_client_ip
+from app.core.types import AppView
+
+router = APIRouter(prefix="/api/echo", tags=["echo"])
+
+
+@cbv(router)
+class CBV(AppView):
+    @router.get("/ip")
+    async def echo_ip(self, request: Request) -> dict[str, str | None]:
+        """IP-echo endpoint for proxy checks, so they don't depend on third-party echo services."""
+        peer = request.client.host if request.client else None
+        forwarded_for = request.headers.get("x-forwarded-for")
+        return {"ip": forwarded_client_ip(peer, forwarded_for, self.core.settings.echo_trusted_proxies)}
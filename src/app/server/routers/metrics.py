@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from mm_base6 import cbv
+from starlette.responses import PlainTextResponse
+
+from app.core.types import AppView
+
+router = APIRouter(prefix="/api/metrics", tags=["metrics"])
+
+
+@cbv(router)
+class CBV(AppView):
+    @router.get("")
+    async def get_metrics(self) -> PlainTextResponse:
+        """Check pipeline metrics in the Prometheus text format."""
+        content = await self.core.services.proxy.render_metrics()
+        return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
@@ -1,12 +1,17 @@
 from typing import Annotated
 
 from bson import ObjectId
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Header, HTTPException, Query
 from mm_base6 import cbv
 from mm_mongo import MongoUpdateResult
-from starlette.responses import JSONResponse, PlainTextResponse, Response
+from mm_std import replace_empty_dict_entries
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 
-from app.core.db import Protocol, Proxy
+from app.core.db import Protocol, Proxy, Status
+from app.core.listing import ProxyPage, ProxySort
+from app.core.live import LiveQuery, LiveSort
+from app.core.rotation import RotationStrategy
+from app.core.snapshot import choose_encoding
 from app.core.types import AppView
 
 router = APIRouter(prefix="/api/proxies", tags=["proxy"])
@@ -14,15 +19,90 @@ router = APIRouter(prefix="/api/proxies", tags=["proxy"])
 
 @cbv(router)
 class CBV(AppView):
+    @router.get("")
+    async def list_proxies(
+        self,
+        source: str | None = None,
+        status: Status | None = None,
+        protocol: Protocol | None = None,
+        sort: ProxySort = ProxySort.CHECKED_AT,
+        desc: bool = True,
+        limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+        cursor: str | None = None,
+    ) -> ProxyPage:
+        """Proxies without their check history, one page at a time: pass `next_cursor` as `cursor` for the next page."""
+        query = replace_empty_dict_entries({"source": source, "status": status, "protocol": protocol})
+        try:
+            listing = self.core.services.proxy.list_proxies(query, sort, desc, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        return await listing.to_page()
+
     @router.get("/live")
     async def get_live_proxies(
         self,
         sources: str | None = None,
         unique_ip: bool = False,
         protocol: Protocol | None = None,
+        sort: LiveSort = LiveSort.URL,
+        max_latency_ms: float | None = None,
+        limit: Annotated[int | None, Query(ge=1)] = None,
+        format_: Annotated[str, Query(alias="format")] = "json",
+        if_none_match: Annotated[str | None, Header()] = None,
+        accept_encoding: Annotated[str, Header()] = "",
+    ) -> Response:
+        """Live proxy urls. Responses carry an ETag, If-None-Match gets a 304 while the live set is unchanged."""
+        q = LiveQuery(
+            sources=tuple(sources.split(",")) if sources else None,
+            protocol=protocol,
+            unique_ip=unique_ip,
+            sort=sort,
+            max_latency_ms=max_latency_ms,
+            limit=limit,
+        )
+        snapshot = self.core.services.proxy.get_live_snapshot(q, "text" if format_ == "text" else "json")
+        encoding = choose_encoding(accept_encoding)
+        headers = {"ETag": snapshot.etag(encoding), "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if snapshot.not_modified(if_none_match, encoding):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=snapshot.encode(encoding), media_type=snapshot.media_type, headers=headers)
+
+    @router.get("/live/stream")
+    async def stream_live_proxies(
+        self,
+        sources: str | None = None,
+        protocol: Protocol | None = None,
+        since: str | None = None,
+        last_event_id: Annotated[str | None, Header()] = None,
+    ) -> StreamingResponse:
+        """Server-Sent Events: a snapshot of live proxy urls, then `added`/`removed` events.
+        Reconnect with the Last-Event-ID header (or `since`) to resume."""
+        stream = self.core.services.proxy.stream_live(
+            tuple(sources.split(",")) if sources else None, protocol, last_event_id if last_event_id is not None else since
+        )
+        return StreamingResponse(
+            stream, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @router.get("/next")
+    async def get_next_proxies(
+        self,
+        strategy: RotationStrategy = RotationStrategy.ROUND_ROBIN,
+        key: str | None = None,
+        count: Annotated[int, Query(ge=1, le=1000)] = 1,
+        sources: str | None = None,
+        unique_ip: bool = False,
+        protocol: Protocol | None = None,
         format_: Annotated[str, Query(alias="format")] = "json",
     ) -> Response:
-        proxies = await self.core.services.proxy.get_live_proxies(sources.split(",") if sources else None, protocol, unique_ip)
+        """Live proxies one (or `count`) at a time; `key` is the session key for the sticky strategy."""
+        if strategy == RotationStrategy.STICKY and not key:
+            raise HTTPException(status_code=400, detail="key is required for the sticky strategy")
+        proxies = self.core.services.proxy.next_proxies(
+            strategy, count, sources.split(",") if sources else None, protocol, unique_ip, key
+        )
         proxy_urls = [p.url for p in proxies]
         if format_ == "text":
             return Response(content="\n".join(proxy_urls), media_type="text/plain")
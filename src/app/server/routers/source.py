@@ -4,6 +4,7 @@ from mm_mongo import MongoDeleteResult, MongoUpdateResult
 from starlette.responses import PlainTextResponse
 
 from app.core.db import Source
+from app.core.services.source import IngestReport
 from app.core.types import AppView
 
 router = APIRouter(prefix="/api/sources", tags=["source"])
@@ -20,12 +21,12 @@ class CBV(AppView):
         return await self.core.db.source.get(id)
 
     @router.post("/{id}/check")
-    async def check_source(self, id: str) -> int:
+    async def check_source(self, id: str) -> IngestReport:
         return await self.core.services.source.check(id)
 
     @router.delete("/{id}/default")
     async def delete_source_default(self, id: str) -> MongoUpdateResult:
-        return await self.core.db.source.set(id, {"default": None})
+        return await self.core.services.source.update(id, {"default": None})
 
     @router.delete("/{id}")
     async def delete_source(self, id: str) -> MongoDeleteResult:
@@ -33,4 +34,4 @@ class CBV(AppView):
 
     @router.delete("/{id}/proxies")
     async def delete_source_proxies(self, id: str) -> MongoDeleteResult:
-        return await self.core.db.proxy.delete_many({"source": id})
+        return await self.core.services.source.delete_proxies(id)
@@ -1,17 +1,20 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, HTTPException
 from fastapi.params import Query
 from mm_base6 import cbv, redirect
 from mm_std import parse_lines, replace_empty_dict_entries
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from starlette.responses import HTMLResponse, RedirectResponse
 
 from app.core.db import Protocol, Source, Status
+from app.core.listing import ProxySort
 from app.core.types import AppView
 
 router = APIRouter(include_in_schema=False)
 
+PROXIES_PAGE_SIZE = 500
+
 
 @cbv(router)
 class PageCBV(AppView):
@@ -21,14 +24,20 @@ class PageCBV(AppView):
 
     @router.get("/bot")
     async def bot(self) -> HTMLResponse:
-        checks_per_minute = await self.core.services.proxy.counter.get_count()
-        return await self.render.html("bot.j2", checks_per_minute=checks_per_minute)
+        pool_stats = self.core.services.proxy.pool.stats()
+        open_circuits = self.core.services.proxy.breaker.open_keys()
+        heartbeats = await self.core.services.proxy.get_heartbeats()
+        reaper_stats = await self.core.services.proxy.get_reaper_stats()
+        return await self.render.html(
+            "bot.j2", pool_stats=pool_stats, open_circuits=open_circuits, heartbeats=heartbeats, reaper_stats=reaper_stats
+        )
 
     @router.get("/sources")
     async def sources_page(self) -> HTMLResponse:
         stats = await self.core.services.source.calc_stats()
+        throughput = await self.core.services.proxy.calc_source_throughput()
         sources = await self.core.db.source.find({}, "_id")
-        return await self.render.html("sources.j2", stats=stats, sources=sources)
+        return await self.render.html("sources.j2", stats=stats, throughput=throughput, sources=sources)
 
     @router.get("/proxies")
     async def proxies_page(
@@ -36,14 +45,28 @@ class PageCBV(AppView):
         source: Annotated[str | None, Query()] = None,
         status: Annotated[str | None, Query()] = None,
         protocol: Annotated[str | None, Query()] = None,
+        sort: Annotated[ProxySort, Query()] = ProxySort.CHECKED_AT,
+        desc: Annotated[bool, Query()] = True,
+        cursor: Annotated[str | None, Query()] = None,
     ) -> HTMLResponse:
         query = replace_empty_dict_entries({"source": source, "status": status, "protocol": protocol})
-        proxies = await self.core.db.proxy.find(query, "proxy_ip")
+        try:
+            listing = self.core.services.proxy.list_proxies(query, sort, desc, PROXIES_PAGE_SIZE, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
         sources = [s.id for s in await self.core.db.source.find({}, "_id")]
         statuses = [s.value for s in list(Status)]
         protocols = [p.value for p in list(Protocol)]
         return await self.render.html(
-            "proxies.j2", proxies=proxies, sources=sources, statuses=statuses, protocols=protocols, query=query
+            "proxies.j2",
+            listing=listing,
+            sources=sources,
+            statuses=statuses,
+            protocols=protocols,
+            query=query,
+            sort=sort.value,
+            desc=int(desc),
+            page_size=PROXIES_PAGE_SIZE,
         )
 
 
@@ -63,7 +86,7 @@ class ActionCBV(AppView):
 
     @router.post("/sources/{id}/items")
     async def set_source_items(self, id: str, items: Annotated[str, Form()]) -> RedirectResponse:
-        await self.core.db.source.set(id, {"items": parse_lines(items, deduplicate=True)})
+        await self.core.services.source.update(id, {"items": parse_lines(items, deduplicate=True)})
         self.render.flash("Source items updated successfully")
         return redirect("/sources")
 
@@ -73,8 +96,18 @@ class ActionCBV(AppView):
         password: str
         port: int
 
+    class SetShareForm(BaseModel):
+        weight: Annotated[float, Field(ge=0)]
+        min_checks_per_minute: Annotated[int, Field(ge=0)]
+
+    @router.post("/sources/{id}/share")
+    async def set_source_share(self, id: str, form: Annotated[SetShareForm, Form()]) -> RedirectResponse:
+        await self.core.services.source.set_share(id, form.weight, form.min_checks_per_minute)
+        self.render.flash("Source share updated successfully")
+        return redirect("/sources")
+
     @router.post("/sources/{id}/default")
     async def set_source_default(self, id: str, form: Annotated[SetDefaultForm, Form()]) -> RedirectResponse:
-        await self.core.db.source.set(id, {"default": form.model_dump()})
+        await self.core.services.source.update(id, {"default": form.model_dump()})
         self.render.flash("Source default updated successfully")
         return redirect("/sources")
@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import signal
+
+from mm_base6 import Core
+
+from app import config
+from app.core.db import Db
+from app.core.services import ServiceRegistry
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_TICKS = 5  # the loop ticks every second, the heartbeat is published every 5th tick
+
+
+async def main(partition: tuple[int, int] | None = None, parent_pid: int | None = None) -> None:
+    """Checker worker: the check pool and its heartbeat, without the web server, UI, telegram bot and scheduled jobs.
+
+    Migrations, the live index, source fetching and the reaper run in the main process only.
+    Proxies are leased in Mongo, so any number of workers share the check load without checking the same proxy twice.
+    A worker spawned by the main process (checker_processes setting) checks only its partition of the proxies.
+    """
+    core = await Core.init(
+        config=config.config,
+        settings_cls=config.Settings,
+        state_cls=config.State,
+        db_cls=Db,
+        service_registry_cls=ServiceRegistry,
+    )
+    proxy = core.services.proxy
+    await proxy.start_checker(partition)
+    logger.info("worker started, partition: %s", partition)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    try:
+        for tick in itertools.count():
+            try:
+                await proxy.supervise_checker()
+                if tick % HEARTBEAT_TICKS == 0:
+                    await proxy.publish_heartbeat()
+            except Exception:
+                logger.exception("checker supervision failed")
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(stop.wait(), 1)
+            if stop.is_set():
+                break
+            if parent_pid is not None and os.getppid() != parent_pid:
+                logger.warning("the main process is gone, stopping")
+                break
+    finally:
+        # only the check pool and the result writer were started, core.startup() never ran in a worker
+        await proxy.on_shutdown()
+        await core.db.proxy.collection.database.client.close()
+
+
+def parse_partition(value: str) -> tuple[int, int]:
+    index, count = map(int, value.split("/"))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"bad partition: {value}")
+    return index, count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mm-proxy checker worker")
+    parser.add_argument("--partition", type=parse_partition, help="index/count, check only this partition of the proxies")
+    parser.add_argument("--parent-pid", type=int, help="stop when this process is gone")
+    args = parser.parse_args()
+    asyncio.run(main(args.partition, args.parent_pid))
@@ -0,0 +1,49 @@
+import time
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from app.core.db import Protocol
+from app.core.live import LiveProxy
+
+NOW = datetime(2025, 1, 1, tzinfo=UTC)
+CUTOFF = NOW - timedelta(minutes=5)  # live proxies were ok after it
+
+
+class Clock:
+    """Stands in for the `time` module of the code under test: monotonic() moves only when the test moves `now`.
+
+    Patch the module's own `time` reference with it; patching time.monotonic itself would move the asyncio loop clock too.
+    """
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(time, name)
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def live_proxy():
+    def make(
+        url, *, source="s1", protocol=Protocol.HTTP, proxy_ip=None, latency_ms=None, success_rate=1.0, age_minutes=1
+    ) -> LiveProxy:
+        return LiveProxy(
+            url=url,
+            source=source,
+            protocol=protocol,
+            proxy_ip=proxy_ip,
+            last_ok_at=NOW - timedelta(minutes=age_minutes),
+            latency_ms=latency_ms,
+            success_rate=success_rate,
+        )
+
+    return make
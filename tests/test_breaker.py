@@ -0,0 +1,74 @@
+import pytest
+
+from app.core import breaker
+from app.core.breaker import CircuitBreaker, CircuitState
+
+
+@pytest.fixture(autouse=True)
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(breaker, "time", clock)
+    return clock
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    assert breaker.record("h", False) is None
+    assert breaker.record("h", False) is None
+    assert breaker.allow("h")
+    assert breaker.record("h", False) == CircuitState.OPEN
+    assert not breaker.allow("h")
+    assert breaker.open_keys() == ["h"]
+    assert breaker.allow("other")
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.record("h", False)
+    assert breaker.record("h", True) is None  # it was closed anyway
+    assert breaker.record("h", False) is None
+    assert breaker.allow("h")
+
+
+def test_half_open_trial_success_closes(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record("h", False)
+    clock.now += 59
+    assert not breaker.allow("h")
+    clock.now += 1
+    assert breaker.allow("h")  # the trial
+    assert not breaker.allow("h")  # only one trial at a time
+    assert breaker.record("h", True) == CircuitState.CLOSED
+    assert breaker.allow("h")
+    assert breaker.open_keys() == []
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60)
+    breaker.record("h", False)
+    clock.now += 60
+    assert breaker.allow("h")
+    assert breaker.record("h", False) is None
+    assert breaker.circuits["h"].state == CircuitState.OPEN
+    clock.now += 30
+    assert not breaker.allow("h")  # a new cooldown from the failed trial
+    clock.now += 30
+    assert breaker.allow("h")
+
+
+def test_lost_trial_is_renewed(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=60, trial_timeout=10)
+    breaker.record("h", False)
+    clock.now += 60
+    assert breaker.allow("h")
+    clock.now += 9
+    assert not breaker.allow("h")
+    clock.now += 1
+    assert breaker.allow("h")  # the first trial never recorded a result
+    assert breaker.circuits["h"].state == CircuitState.HALF_OPEN
+
+
+def test_zero_threshold_disables():
+    breaker = CircuitBreaker(threshold=0)
+    for _ in range(10):
+        assert breaker.record("h", False) is None
+    assert breaker.allow("h")
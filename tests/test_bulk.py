@@ -0,0 +1,99 @@
+import asyncio
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.core.bulk import BulkWriteBuffer
+
+
+class FakeCollection:
+    """bulk_write records the batches; it hangs while `release` is not set."""
+
+    def __init__(self) -> None:
+        self.batches: list[list[UpdateOne]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.error: Exception | None = None
+
+    async def bulk_write(self, ops, ordered):
+        assert not ordered
+        await self.release.wait()
+        self.batches.append(ops)
+        if self.error:
+            raise self.error
+
+
+def op(id: ObjectId) -> UpdateOne:
+    return UpdateOne({"_id": id}, {"$set": {"checked_at": 1}})
+
+
+def test_flush_on_size():
+    async def run():
+        collection = FakeCollection()
+        buffer = BulkWriteBuffer(collection, batch_size=3, flush_interval=60)
+        ids = [ObjectId() for _ in range(4)]
+        for id in ids:
+            await buffer.add(id, op(id))
+        assert [len(b) for b in collection.batches] == [3]
+        assert len(buffer) == 1
+        assert await buffer.flush() == 1
+        assert await buffer.flush() == 0  # nothing left
+        assert [len(b) for b in collection.batches] == [3, 1]
+
+    asyncio.run(run())
+
+
+def test_flush_on_interval():
+    async def run():
+        collection = FakeCollection()
+        durations: list[float] = []
+        buffer = BulkWriteBuffer(collection, batch_size=100, flush_interval=0.02, on_flush=durations.append)
+        buffer.start()
+        id = ObjectId()
+        await buffer.add(id, op(id))
+        await asyncio.sleep(0.05)
+        assert [len(b) for b in collection.batches] == [1]
+        assert len(durations) == 1
+        await buffer.add(id, op(id))
+        await buffer.stop()  # flushes the rest
+        assert buffer.task is None
+        assert [len(b) for b in collection.batches] == [1, 1]
+
+    asyncio.run(run())
+
+
+def test_pending_ids_during_flush():
+    async def run():
+        collection = FakeCollection()
+        collection.release.clear()
+        buffer = BulkWriteBuffer(collection, batch_size=100)
+        flushed, added = ObjectId(), ObjectId()
+        await buffer.add(flushed, op(flushed))
+        flush = asyncio.create_task(buffer.flush())
+        await asyncio.sleep(0)
+        assert len(buffer) == 0
+        assert buffer.pending_ids() == {flushed}  # out of the buffer, but not written yet
+        await buffer.add(added, op(added))
+        assert buffer.pending_ids() == {flushed, added}
+        collection.release.set()
+        await flush
+        assert buffer.pending_ids() == {added}
+
+    asyncio.run(run())
+
+
+def test_errors_are_not_raised():
+    async def run():
+        collection = FakeCollection()
+        buffer = BulkWriteBuffer(collection)
+        id = ObjectId()
+        collection.error = BulkWriteError({"writeErrors": [{"index": 0, "code": 121}]})
+        await buffer.add(id, op(id))
+        assert await buffer.flush() == 1
+        collection.error = ConnectionError()
+        await buffer.add(id, op(id))
+        assert await buffer.flush() == 1  # lost, logged
+        assert not buffer.pending_ids()
+
+    asyncio.run(run())
@@ -0,0 +1,54 @@
+from app.core.db import CheckHistory
+
+
+def test_push_newest_first():
+    history = CheckHistory().push(True).push(False).push(False)
+    assert history.to_list() == [False, False, True]
+    assert history.length == 3
+    assert history.ok == 1
+    assert history.down == 2
+
+
+def test_push_evicts_oldest():
+    history = CheckHistory()
+    history = history.push(False)
+    for _ in range(CheckHistory.SIZE):
+        history = history.push(True)
+    assert history.length == CheckHistory.SIZE
+    assert history.ok == CheckHistory.SIZE
+    assert history.down == 0
+    assert history.to_list() == [True] * CheckHistory.SIZE
+
+
+def test_push_carries_into_hi_word():
+    history = CheckHistory().push(True)
+    for _ in range(CheckHistory.WORD_BITS):
+        history = history.push(False)
+    assert history.lo == 0
+    assert history.hi == 1
+    assert history.to_list()[CheckHistory.WORD_BITS] is True
+
+
+def test_from_list_round_trip():
+    legacy = [True, False, False, True, True] * 30  # longer than SIZE, the tail is dropped
+    history = CheckHistory.from_list(legacy)
+    assert history.to_list() == legacy[: CheckHistory.SIZE]
+    assert history.ok == legacy[: CheckHistory.SIZE].count(True)
+    assert history.down == legacy[: CheckHistory.SIZE].count(False)
+
+
+def test_from_list_empty():
+    assert CheckHistory.from_list([]) == CheckHistory()
+
+
+def test_consecutive_down():
+    assert CheckHistory().consecutive_down() == 0
+    assert CheckHistory.from_list([False, False, True, False]).consecutive_down() == 2
+    assert CheckHistory.from_list([True, False, False]).consecutive_down() == 0
+    assert CheckHistory.from_list([False] * 3).consecutive_down() == 3
+    assert CheckHistory.from_list([False] * 120).consecutive_down() == CheckHistory.SIZE
+
+
+def test_consecutive_down_across_words():
+    history = CheckHistory.from_list([False] * 70 + [True])
+    assert history.consecutive_down() == 70
@@ -0,0 +1,106 @@
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+from bson import ObjectId
+
+from app.core.checker import CheckPool
+from app.core.metrics import RateCounter
+
+
+class Due:
+    """Fake fetch_due: returns the same due proxies every time, until they are checked."""
+
+    def __init__(self, n: int) -> None:
+        self.proxies = [SimpleNamespace(id=ObjectId()) for _ in range(n)]
+        self.checked: Counter[ObjectId] = Counter()
+        self.release = asyncio.Event()
+
+    async def fetch(self, limit: int):
+        return [p for p in self.proxies if p.id not in self.checked][:limit]
+
+    async def check(self, proxy):
+        await self.release.wait()
+        self.checked[proxy.id] += 1
+
+
+def test_pending_proxies_are_not_enqueued_again():
+    async def run():
+        due = Due(3)
+        pool = CheckPool(due.fetch, due.check, RateCounter(), idle_sleep=0.01)
+        await pool.start(2)
+        await asyncio.sleep(0.05)  # the producer polls several times while the checks hang
+        assert pool.pending == {p.id for p in due.proxies}
+        assert pool.in_flight == 2
+        assert pool.queue.qsize() == 1
+        due.release.set()
+        await asyncio.sleep(0.05)
+        assert due.checked == Counter({p.id: 1 for p in due.proxies})
+        assert not pool.pending
+        assert pool.stats().checks_per_minute == 3
+        await pool.stop()
+
+    asyncio.run(run())
+
+
+def test_failed_check_is_released():
+    async def run():
+        due = Due(1)
+        calls = 0
+
+        async def check(_proxy):
+            nonlocal calls
+            calls += 1
+            raise RuntimeError
+
+        pool = CheckPool(due.fetch, check, RateCounter(), idle_sleep=0.01)
+        await pool.start(1)
+        await asyncio.sleep(0.03)
+        assert calls > 1  # not pending anymore, so it's enqueued again while it stays due
+        assert pool.in_flight == 0
+        assert pool.stats().checks_per_minute == 0
+        await pool.stop()
+
+    asyncio.run(run())
+
+
+def test_restart_on_concurrency_change():
+    async def run():
+        due = Due(0)
+        pool = CheckPool(due.fetch, due.check, RateCounter(), idle_sleep=0.01)
+        await pool.start(0)
+        assert pool.concurrency == 1  # at least one consumer
+        tasks = pool.tasks
+        await pool.start(1)
+        assert pool.tasks is tasks  # unchanged, not restarted
+        await pool.start(4)
+        assert len(pool.tasks) == 5  # the producer and 4 consumers
+        assert pool.queue.maxsize == 8
+        assert all(t.cancelled() for t in tasks)
+        await pool.stop()
+        assert not pool.running
+        assert pool.stats().concurrency == 4
+
+    asyncio.run(run())
+
+
+def test_fetch_errors_are_retried():
+    async def run():
+        due = Due(1)
+        due.release.set()
+        calls = 0
+
+        async def fetch(limit):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise ConnectionError
+            return await due.fetch(limit)
+
+        pool = CheckPool(fetch, due.check, RateCounter(), idle_sleep=0.01)
+        await pool.start(1)
+        await asyncio.sleep(0.05)
+        assert sum(due.checked.values()) == 1
+        await pool.stop()
+
+    asyncio.run(run())
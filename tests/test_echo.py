@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.core import echo
+from app.core.echo import EchoChecker, forwarded_client_ip, parse_echo_ip
+
+
+class Endpoints:
+    """Fake echo_ip: each url answers `ip` after `delay` seconds; calls and cancellations are recorded."""
+
+    def __init__(self, **answers: tuple[float, str | None]) -> None:
+        self.answers = answers  # host -> (delay, ip)
+        self.calls: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def echo_ip(self, url: str, _proxy: str | None, _timeout: float) -> str | None:
+        host = url.removeprefix("http://")
+        self.calls.append(host)
+        delay, ip = self.answers[host]
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(host)
+            raise
+        return ip
+
+
+@pytest.fixture
+def checker():
+    checker = EchoChecker()
+    checker.configure("http://a, http://b", 0.9)
+    checker.DEFAULT_HEDGE_DELAY = 0.05
+    return checker
+
+
+def get_ip(checker, endpoints, monkeypatch, timeout=2.0):
+    monkeypatch.setattr(echo, "echo_ip", endpoints.echo_ip)
+    return asyncio.run(checker.get_ip("http://proxy:8080", timeout))
+
+
+def test_fast_primary_is_not_hedged(checker, monkeypatch):
+    endpoints = Endpoints(a=(0, "1.1.1.1"), b=(0, "2.2.2.2"))
+    assert get_ip(checker, endpoints, monkeypatch) == "1.1.1.1"
+    assert endpoints.calls == ["a"]
+    assert len(checker.latencies) == 1
+
+
+def test_slow_primary_is_hedged(checker, monkeypatch):
+    endpoints = Endpoints(a=(1, "1.1.1.1"), b=(0, "2.2.2.2"))
+    assert get_ip(checker, endpoints, monkeypatch) == "2.2.2.2"
+    assert endpoints.calls == ["a", "b"]
+    assert endpoints.cancelled == ["a"]
+    assert not checker.latencies  # only answers of the primary are samples
+
+
+def test_failed_primary_falls_back_at_once(checker, monkeypatch):
+    endpoints = Endpoints(a=(0, None), b=(0.2, "2.2.2.2"))
+    assert get_ip(checker, endpoints, monkeypatch) == "2.2.2.2"
+    assert endpoints.calls == ["a", "b"]
+
+
+def test_round_robin(checker, monkeypatch):
+    endpoints = Endpoints(a=(0, "1.1.1.1"), b=(0, "2.2.2.2"))
+    assert [get_ip(checker, endpoints, monkeypatch) for _ in range(3)] == ["1.1.1.1", "2.2.2.2", "1.1.1.1"]
+
+
+def test_single_url_is_not_hedged(monkeypatch):
+    checker = EchoChecker()
+    checker.configure("http://a", 0.9)
+    checker.DEFAULT_HEDGE_DELAY = 0.01
+    endpoints = Endpoints(a=(0.05, None))
+    assert get_ip(checker, endpoints, monkeypatch) is None
+    assert endpoints.calls == ["a"]
+
+
+def test_hedge_delay_quantile(checker):
+    assert checker.hedge_delay() == checker.DEFAULT_HEDGE_DELAY
+    checker.latencies.extend(i / 100 for i in range(1, 101))
+    assert checker.hedge_delay() == pytest.approx(0.9, abs=0.01)
+
+
+def test_configure():
+    checker = EchoChecker()
+    checker.configure(" , ", 2)
+    assert checker.urls == ["https://api.ipify.org/?format=json", "https://httpbin.org/ip"]
+    assert checker.quantile == 0.99
+    assert checker.target() == ("api.ipify.org", 443)
+
+
+def test_parse_echo_ip():
+    assert parse_echo_ip('{"ip": "1.2.3.4"}') == "1.2.3.4"
+    assert parse_echo_ip('{"origin": "1.2.3.4, 5.6.7.8"}') == "1.2.3.4"
+    assert parse_echo_ip("  2001:db8::1\n") == "2001:db8::1"
+    assert parse_echo_ip(None) is None
+    assert parse_echo_ip("") is None
+    assert parse_echo_ip("<html>blocked</html>") is None
+    assert parse_echo_ip('{"ip": ') is None
+    assert parse_echo_ip('{"ip": 42}') is None
+    assert parse_echo_ip("[1]") is None
+
+
+def test_forwarded_client_ip():
+    trusted = "10.0.0.1, 10.0.0.2"
+    assert forwarded_client_ip("10.0.0.1", "6.6.6.6, 1.2.3.4", trusted) == "1.2.3.4"  # the right-most hop
+    assert forwarded_client_ip("10.0.0.2", "1.2.3.4", trusted) == "1.2.3.4"
+    assert forwarded_client_ip("10.0.0.1", None, trusted) == "10.0.0.1"
+    assert forwarded_client_ip("5.5.5.5", "1.2.3.4", trusted) == "5.5.5.5"  # a proxy can't spoof it
+    assert forwarded_client_ip("5.5.5.5", "1.2.3.4", "") == "5.5.5.5"
+    assert forwarded_client_ip(None, "1.2.3.4", trusted) is None
@@ -0,0 +1,114 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.core import fair, metrics
+from app.core.fair import FairScheduler, SourceShare
+
+
+@pytest.fixture(autouse=True)
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(fair, "time", clock)
+    monkeypatch.setattr(metrics, "time", clock)  # the claim counters
+    return clock
+
+
+class Sources:
+    """Fake fetch: each source has `due` proxies (None is unlimited); a claimed proxy is the source name."""
+
+    def __init__(self, **due: int | None) -> None:
+        self.due = due
+        self.calls: list[tuple[str, int]] = []
+
+    async def fetch(self, source: str, limit: int) -> list[str]:
+        self.calls.append((source, limit))
+        due = self.due[source]
+        n = limit if due is None else min(limit, due)
+        if due is not None:
+            self.due[source] = due - n
+        return [source] * n
+
+
+def claim(scheduler, limit, shares, sources):
+    return Counter(asyncio.run(scheduler.claim(limit, shares, sources.fetch)))
+
+
+def test_weights_are_proportional():
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=None, b=None, c=None)
+    shares = {"a": SourceShare(weight=3), "b": SourceShare(weight=1), "c": SourceShare(weight=0)}
+    total = Counter()
+    for _ in range(10):
+        res = claim(scheduler, 40, shares, sources)
+        assert res.total() == 40
+        total += res
+    assert total == Counter(a=300, b=100)
+
+
+def test_fractional_weights():
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=None, b=None)
+    shares = {"a": SourceShare(weight=1), "b": SourceShare(weight=0.125)}
+    total = Counter()
+    for _ in range(18):
+        total += claim(scheduler, 20, shares, sources)
+    assert total == Counter(a=320, b=40)
+
+
+def test_small_weight_accumulates_deficit():
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=None, b=None)
+    shares = {"a": SourceShare(weight=1), "b": SourceShare(weight=0.025)}  # half a claim per turn
+    total = Counter()
+    for _ in range(20):
+        total += claim(scheduler, 20, shares, sources)
+    assert total.total() == 400
+    assert 0 < total["b"] <= 10
+
+
+def test_tiny_weight_skips_the_rounds():
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=0, b=None)
+    shares = {"a": SourceShare(), "b": SourceShare(weight=1e-9)}  # a claim per 50 million turns
+    # nobody else has due proxies, so the capacity goes to b, without turning 500 million times
+    assert claim(scheduler, 10, shares, sources) == Counter(b=10)
+    assert scheduler.deficits["b"] < 1
+
+
+def test_minimums_come_first(clock):
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=None, b=None)
+    shares = {"a": SourceShare(weight=1), "b": SourceShare(weight=0, min_per_minute=30)}
+    assert claim(scheduler, 40, shares, sources) == Counter(a=10, b=30)
+    assert scheduler.claim_rate("b") == 30
+    clock.now += 30
+    assert claim(scheduler, 40, shares, sources) == Counter(a=40)  # the minimum is met for this minute
+    clock.now += 31
+    assert claim(scheduler, 40, shares, sources) == Counter(a=10, b=30)
+
+
+def test_minimum_is_capped_by_limit():
+    scheduler = FairScheduler(quantum=20)
+    sources = Sources(a=None)
+    assert claim(scheduler, 10, {"a": SourceShare(weight=0, min_per_minute=100)}, sources) == Counter(a=10)
+
+
+def test_drained_source_is_skipped(clock):
+    scheduler = FairScheduler(quantum=20, drained_seconds=1.0)
+    sources = Sources(a=5, b=None)
+    shares = {"a": SourceShare(), "b": SourceShare()}
+    assert claim(scheduler, 40, shares, sources) == Counter(a=5, b=35)
+    sources.calls.clear()
+    sources.due["a"] = 100
+    assert claim(scheduler, 40, shares, sources) == Counter(b=40)
+    assert all(source == "b" for source, _ in sources.calls)
+    clock.now += 1
+    assert claim(scheduler, 40, shares, sources)["a"] > 0
+
+
+def test_nothing_due():
+    scheduler = FairScheduler()
+    sources = Sources(a=0, b=0)
+    assert claim(scheduler, 40, {"a": SourceShare(), "b": SourceShare()}, sources) == Counter()
+    assert claim(scheduler, 40, {}, sources) == Counter()
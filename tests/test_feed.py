@@ -0,0 +1,104 @@
+import asyncio
+from datetime import UTC, datetime
+from types import SimpleNamespace
+
+from app.core.db import Protocol
+from app.core.feed import LiveEventType, LiveFeed, sse_message
+from app.core.live import LiveProxy
+from app.core.services.proxy import ProxyService
+
+
+def publish(feed, n):
+    for i in range(n):
+        feed.publish(LiveEventType.ADDED, f"http://1.2.3.{i}:80", "s1", Protocol.HTTP)
+
+
+def test_since():
+    feed = LiveFeed()
+    assert feed.since(0) == []
+    publish(feed, 3)
+    assert [e.seq for e in feed.since(0) or []] == [1, 2, 3]
+    assert [e.seq for e in feed.since(2) or []] == [3]
+    assert feed.since(3) == []
+
+
+def test_since_future_seq():
+    feed = LiveFeed()
+    publish(feed, 2)
+    assert feed.since(5) is None
+
+
+def test_parse_event_id():
+    feed = LiveFeed()
+    assert feed.parse_event_id(f"{feed.epoch}:7") == 7
+    assert feed.parse_event_id("0:7") is None  # from before a restart, even if the sequence is buffered
+    assert feed.parse_event_id("7") is None
+    assert feed.parse_event_id(f"{feed.epoch}:x") is None
+
+
+def test_since_gap():
+    feed = LiveFeed(size=3)
+    publish(feed, 5)
+    assert feed.since(1) is None  # event 2 is not in the buffer anymore
+    assert [e.seq for e in feed.since(2) or []] == [3, 4, 5]
+
+
+def test_matches():
+    feed = LiveFeed()
+    feed.publish(LiveEventType.ADDED, "socks5://1.2.3.4:1080", "s1", Protocol.SOCKS5)
+    feed.publish(LiveEventType.RESET)
+    added, reset = feed.since(0) or []
+    assert added.matches(None, None)
+    assert added.matches(("s1",), Protocol.SOCKS5)
+    assert not added.matches(("s2",), None)
+    assert not added.matches(None, Protocol.HTTP)
+    assert reset.matches(("s2",), Protocol.HTTP)
+
+
+def test_to_sse():
+    feed = LiveFeed()
+    feed.publish(LiveEventType.REMOVED, "http://1.2.3.4:80", "s1", Protocol.HTTP)
+    event = (feed.since(0) or [])[0]
+    assert event.to_sse("e1") == (
+        'event: removed\nid: e1:1\ndata: {"url":"http://1.2.3.4:80","source":"s1","protocol":"http","proxy_ip":null}\n\n'
+    )
+    assert sse_message("snapshot", [1]) == "event: snapshot\ndata: [1]\n\n"
+
+
+def test_wait():
+    async def run():
+        feed = LiveFeed()
+        assert not await feed.wait(0, timeout=0.01)
+        waiter = asyncio.create_task(feed.wait(0, timeout=1))
+        await asyncio.sleep(0)
+        publish(feed, 1)
+        assert await waiter
+        assert await feed.wait(0, timeout=0)  # already behind
+
+    asyncio.run(run())
+
+
+def test_stream_live_resume():
+    service = ProxyService()
+    service.core = SimpleNamespace(settings=SimpleNamespace(live_last_ok_minutes=5))
+    feed = service.live.feed
+
+    def upsert(url):
+        service.live.upsert(LiveProxy(url=url, source="s1", protocol=Protocol.HTTP, proxy_ip=None, last_ok_at=datetime.now(UTC)))
+
+    async def first(last_event_id):
+        stream = service.stream_live(None, None, last_event_id)
+        message = await anext(stream)
+        await stream.aclose()
+        return message
+
+    async def run():
+        upsert("http://1.1.1.1:80")
+        upsert("http://2.2.2.2:80")
+        assert (await first(None)).startswith(f"event: snapshot\nid: {feed.epoch}:2\n")
+        assert (await first(f"{feed.epoch}:1")).startswith(f"event: added\nid: {feed.epoch}:2\n")
+        # the same sequence from before a restart gets a snapshot, not the events of this process
+        assert (await first("0:1")).startswith(f"event: snapshot\nid: {feed.epoch}:2\n")
+        assert (await first("1")).startswith("event: snapshot")
+
+    asyncio.run(run())
@@ -0,0 +1,324 @@
+import asyncio
+import base64
+import struct
+from datetime import UTC, datetime
+
+from app.core.db import Protocol
+from app.core.gateway import ProxyGateway, UpstreamPool, is_loopback, read_socks5_address, relay
+from app.core.live import LiveProxy
+
+
+async def serve(handler):
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+async def echo_handler(reader, writer):
+    """Target server: echoes the first chunk back, prefixed."""
+    data = await reader.read(1024)
+    writer.write(b"echo:" + data)
+    await writer.drain()
+    writer.close()
+
+
+class HttpUpstream:
+    """Upstream HTTP proxy: answers CONNECT with `status`, and tunnels to the target on 200."""
+
+    def __init__(self, status: int = 200) -> None:
+        self.status = status
+        self.requests: list[str] = []
+
+    async def handle(self, reader, writer):
+        head = (await reader.readuntil(b"\r\n\r\n")).decode()
+        self.requests.append(head)
+        target = head.split(" ")[1]
+        host, _, port = target.rpartition(":")
+        writer.write(f"HTTP/1.1 {self.status} Status\r\n\r\n".encode())
+        await writer.drain()
+        if self.status != 200:
+            writer.close()
+            return
+        await relay((reader, writer), await asyncio.open_connection(host, int(port)))
+        writer.close()
+
+
+async def socks5_upstream_handler(reader, writer):
+    """Upstream SOCKS5 proxy without auth."""
+    _, count = await reader.readexactly(2)
+    assert 0 in await reader.readexactly(count)
+    writer.write(b"\x05\x00")
+    _, _, _, address_type = await reader.readexactly(4)
+    host = await read_socks5_address(reader, address_type)
+    (port,) = struct.unpack("!H", await reader.readexactly(2))
+    writer.write(b"\x05\x00\x00\x01" + bytes(6))
+    await writer.drain()
+    await relay((reader, writer), await asyncio.open_connection(host, port))
+    writer.close()
+
+
+class Upstreams:
+    """pick_upstream / report_failure of the gateway over a fixed list of upstream urls."""
+
+    def __init__(self, *urls: str) -> None:
+        self.urls = list(urls)
+        self.failed: list[str] = []
+
+    def pick(self, exclude):
+        url = next((u for u in self.urls if u not in exclude), None)
+        if url is None:
+            return None
+        protocol = Protocol.SOCKS5 if url.startswith("socks5") else Protocol.HTTP
+        return LiveProxy(url=url, source="s1", protocol=protocol, proxy_ip=None, last_ok_at=datetime.now(UTC))
+
+    async def report(self, url):
+        self.failed.append(url)
+
+
+async def start_gateway(upstreams, credentials=None):
+    gateway = ProxyGateway(upstreams.pick, upstreams.report)
+    gateway.pool.size = 0
+    gateway.connect_timeout = 1
+    gateway.credentials = credentials
+    await gateway.listen(("127.0.0.1", 0))
+    assert gateway.server is not None
+    return gateway, gateway.server.sockets[0].getsockname()[1]
+
+
+async def socks5_client(port, target_port, auth=None, methods=b"\x00"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"\x05" + bytes([len(methods)]) + methods)
+    version, method = await reader.readexactly(2)
+    if method == 0xFF:
+        return method, None, reader, writer
+    if method == 2:
+        user, pwd = auth
+        writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+        _, status = await reader.readexactly(2)
+        if status != 0:
+            return status, None, reader, writer
+    writer.write(b"\x05\x01\x00\x01" + bytes([127, 0, 0, 1]) + struct.pack("!H", target_port))
+    reply = await reader.readexactly(10)
+    return version, reply[1], reader, writer
+
+
+def basic(user, password):
+    return "Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()
+
+
+def test_socks5_tunnel_through_http_upstream():
+    async def run():
+        target, target_port = await serve(echo_handler)
+        upstream = HttpUpstream()
+        up, up_port = await serve(upstream.handle)
+        gateway, port = await start_gateway(Upstreams(f"http://127.0.0.1:{up_port}"))
+        _, reply, reader, writer = await socks5_client(port, target_port)
+        assert reply == 0
+        writer.write(b"hello")
+        assert await reader.read(1024) == b"echo:hello"
+        assert upstream.requests[0].startswith(f"CONNECT 127.0.0.1:{target_port} HTTP/1.1")
+        assert gateway.stats.tunnels == 1
+        writer.close()
+        await gateway.stop()
+        target.close()
+        up.close()
+
+    asyncio.run(run())
+
+
+def test_socks5_auth():
+    async def run():
+        target, target_port = await serve(echo_handler)
+        up, up_port = await serve(socks5_upstream_handler)
+        gateway, port = await start_gateway(Upstreams(f"socks5://127.0.0.1:{up_port}"), credentials=("user", "pass"))
+
+        method, _, _, writer = await socks5_client(port, target_port)  # no auth offered
+        assert method == 0xFF
+        writer.close()
+
+        status, _, _, writer = await socks5_client(port, target_port, auth=(b"user", b"wrong"), methods=b"\x00\x02")
+        assert status == 1
+        writer.close()
+
+        _, reply, reader, writer = await socks5_client(port, target_port, auth=(b"user", b"pass"), methods=b"\x00\x02")
+        assert reply == 0
+        writer.write(b"hi")
+        assert await reader.read(1024) == b"echo:hi"
+        writer.close()
+        await gateway.stop()
+        target.close()
+        up.close()
+
+    asyncio.run(run())
+
+
+async def http_request(port, request: str):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request.encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    return head.decode(), reader, writer
+
+
+def test_http_connect_auth():
+    async def run():
+        target, target_port = await serve(echo_handler)
+        up, up_port = await serve(HttpUpstream().handle)
+        gateway, port = await start_gateway(Upstreams(f"http://127.0.0.1:{up_port}"), credentials=("user", "pass"))
+        connect = f"CONNECT 127.0.0.1:{target_port} HTTP/1.1\r\nHost: 127.0.0.1:{target_port}\r\n"
+
+        head, _, writer = await http_request(port, connect + "\r\n")
+        assert head.startswith("HTTP/1.1 407")
+        assert 'Proxy-Authenticate: Basic realm="mm-proxy"' in head
+        writer.close()
+
+        head, _, writer = await http_request(port, connect + f"Proxy-Authorization: {basic('user', 'bad')}\r\n\r\n")
+        assert head.startswith("HTTP/1.1 407")
+        writer.close()
+
+        head, reader, writer = await http_request(port, connect + f"Proxy-Authorization: {basic('user', 'pass')}\r\n\r\n")
+        assert head.startswith("HTTP/1.1 200")
+        writer.write(b"ping")
+        assert await reader.read(1024) == b"echo:ping"
+        writer.close()
+        await gateway.stop()
+        target.close()
+        up.close()
+
+    asyncio.run(run())
+
+
+def test_http_absolute_url():
+    received: list[bytes] = []
+
+    async def target_handler(reader, writer):
+        received.append(await reader.readuntil(b"\r\n\r\n"))
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+        await writer.drain()
+        writer.close()
+
+    async def run():
+        target, target_port = await serve(target_handler)
+        up, up_port = await serve(HttpUpstream().handle)
+        gateway, port = await start_gateway(Upstreams(f"http://127.0.0.1:{up_port}"))
+        host = f"127.0.0.1:{target_port}"
+        request = f"GET http://{host}/path?q=1 HTTP/1.1\r\nHost: {host}\r\nProxy-Connection: keep-alive\r\nAccept: */*\r\n\r\n"
+        head, reader, writer = await http_request(port, request)
+        assert head.startswith("HTTP/1.1 200 OK")
+        assert await reader.read(1024) == b"ok"
+        writer.close()
+        # origin-form request line, hop-by-hop headers dropped, one request per connection
+        assert received == [f"GET /path?q=1 HTTP/1.1\r\nHost: {host}\r\nAccept: */*\r\nConnection: close\r\n\r\n".encode()]
+
+        head, _, writer = await http_request(port, "GET /relative HTTP/1.1\r\n\r\n")
+        assert head.startswith("HTTP/1.1 400")
+        writer.close()
+        await gateway.stop()
+        target.close()
+        up.close()
+
+    asyncio.run(run())
+
+
+def test_failover():
+    async def run():
+        target, target_port = await serve(echo_handler)
+        refusing = HttpUpstream(status=502)  # works, but can't reach the target
+        refusing_server, refusing_port = await serve(refusing.handle)
+        dead_server, dead_port = await serve(echo_handler)
+        dead_server.close()
+        await dead_server.wait_closed()
+        good, good_port = await serve(HttpUpstream().handle)
+        upstreams = Upstreams(
+            f"http://127.0.0.1:{dead_port}", f"http://127.0.0.1:{refusing_port}", f"http://127.0.0.1:{good_port}"
+        )
+        gateway, port = await start_gateway(upstreams)
+
+        head, reader, writer = await http_request(port, f"CONNECT 127.0.0.1:{target_port} HTTP/1.1\r\n\r\n")
+        assert head.startswith("HTTP/1.1 200")
+        writer.write(b"x")
+        assert await reader.read(1024) == b"echo:x"
+        writer.close()
+        # the dead upstream is reported, the one that refused the target is not
+        assert upstreams.failed == [f"http://127.0.0.1:{dead_port}"]
+        assert len(refusing.requests) == 1
+        assert gateway.stats.upstream_failures == 1
+
+        gateway.retries = 2  # dead and refusing only
+        head, _, writer = await http_request(port, f"CONNECT 127.0.0.1:{target_port} HTTP/1.1\r\n\r\n")
+        assert head.startswith("HTTP/1.1 502")
+        writer.close()
+        await gateway.stop()
+        for server in (target, refusing_server, good):
+            server.close()
+
+    asyncio.run(run())
+
+
+def test_handshake_timeout():
+    async def run():
+        gateway, port = await start_gateway(Upstreams())
+        gateway.handshake_timeout = 0.1
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET http://example.com/ HTTP/1.1\r\n")  # the head never ends
+        async with asyncio.timeout(2):
+            assert await reader.read() == b""
+        writer.close()
+        await gateway.stop()
+
+    asyncio.run(run())
+
+
+def test_listen_requires_credentials_off_loopback():
+    async def run():
+        gateway = ProxyGateway(Upstreams().pick, Upstreams().report)
+        await gateway.listen(("0.0.0.0", 0))
+        assert gateway.server is None
+        assert gateway.refused == ("0.0.0.0", 0)
+        gateway.credentials = ("user", "pass")
+        await gateway.listen(("127.0.0.1", 0))
+        assert gateway.server is not None
+        await gateway.listen(None)
+        assert gateway.server is None
+
+    asyncio.run(run())
+    assert is_loopback("127.0.0.1")
+    assert is_loopback("::1")
+    assert is_loopback("localhost")
+    assert not is_loopback("0.0.0.0")
+    assert not is_loopback("proxy.example")
+
+
+def test_upstream_pool():
+    async def handler(reader, writer):
+        await reader.read()
+        writer.close()
+
+    async def run():
+        server, port = await serve(handler)
+        url = f"http://127.0.0.1:{port}"
+        pool = UpstreamPool(size=2, max_idle=30)
+        assert pool.acquire(url) is None
+        pool.replenish(url, timeout=1)
+        pool.replenish(url, timeout=1)
+        pool.replenish(url, timeout=1)  # already warming `size` connections
+        assert len(pool.warming) == 2
+        await asyncio.gather(*pool.warming)
+        assert len(pool) == 2
+
+        conn = pool.acquire(url)
+        assert conn is not None
+        conn.close()
+        assert len(pool) == 1
+
+        pool.max_idle = 0  # the rest is stale now
+        pool.prune()
+        assert len(pool) == 0
+        assert url not in pool.idle
+        assert pool.acquire(url) is None
+
+        pool.replenish(url, timeout=1)
+        await pool.close()  # cancels the warming connection
+        assert not pool.warming
+        assert len(pool) == 0
+        server.close()
+
+    asyncio.run(run())
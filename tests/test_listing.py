@@ -0,0 +1,53 @@
+from datetime import UTC, datetime
+
+import pytest
+from bson import ObjectId
+
+from app.core.listing import ProxySort, decode_cursor, encode_cursor, keyset_query
+
+ID = ObjectId("65a000000000000000000001")
+AT = datetime(2025, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+
+def test_keyset_query_ascending():
+    assert keyset_query(ProxySort.CHECKED_AT, False, AT, ID) == {
+        "$or": [{"checked_at": {"$gt": AT}}, {"checked_at": AT, "_id": {"$gt": ID}}]
+    }
+
+
+def test_keyset_query_descending_includes_nulls():
+    # nulls sort first ascending, so they are last in the descending order
+    assert keyset_query(ProxySort.CHECKED_AT, True, AT, ID) == {
+        "$or": [{"checked_at": {"$lt": AT}}, {"checked_at": AT, "_id": {"$lt": ID}}, {"checked_at": None}]
+    }
+
+
+def test_keyset_query_null_value_ascending():
+    assert keyset_query(ProxySort.LAST_OK_AT, False, None, ID) == {
+        "$or": [{"last_ok_at": None, "_id": {"$gt": ID}}, {"last_ok_at": {"$ne": None}}]
+    }
+
+
+def test_keyset_query_null_value_descending():
+    assert keyset_query(ProxySort.LAST_OK_AT, True, None, ID) == {"last_ok_at": None, "_id": {"$lt": ID}}
+
+
+@pytest.mark.parametrize(
+    ("sort", "value"),
+    [
+        (ProxySort.STATUS, "OK"),
+        (ProxySort.CHECKED_AT, AT),
+        (ProxySort.LAST_OK_AT, None),
+        (ProxySort.STATUS, None),
+    ],
+)
+def test_cursor_round_trip(sort, value):
+    cursor = encode_cursor(value, ID)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, sort) == (value, ID)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", encode_cursor("OK", ID)[:-4], encode_cursor("yesterday", ID)])
+def test_decode_bad_cursor(cursor):
+    with pytest.raises(ValueError, match="bad cursor"):
+        decode_cursor(cursor, ProxySort.CHECKED_AT)
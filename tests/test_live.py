@@ -0,0 +1,89 @@
+from app.core.db import Protocol
+from app.core.feed import LiveEventType
+from app.core.live import LiveIndex, LiveQuery, LiveSort
+from tests.conftest import CUTOFF
+
+
+def urls(proxies):
+    return [p.url for p in proxies]
+
+
+def test_query_sorted_by_url_across_groups(live_proxy):
+    index = LiveIndex()
+    index.rebuild(
+        [
+            live_proxy("http://c:1"),
+            live_proxy("socks5://a:1", protocol=Protocol.SOCKS5),
+            live_proxy("http://b:1", source="s2"),
+        ]
+    )
+    assert urls(index.query(CUTOFF, LiveQuery())) == ["http://b:1", "http://c:1", "socks5://a:1"]
+
+
+def test_query_filters(live_proxy):
+    index = LiveIndex()
+    index.rebuild(
+        [
+            live_proxy("http://a:1", latency_ms=100),
+            live_proxy("http://b:1", source="s2", latency_ms=300),
+            live_proxy("socks5://c:1", protocol=Protocol.SOCKS5),
+            live_proxy("http://old:1", age_minutes=10),
+        ]
+    )
+    assert urls(index.query(CUTOFF, LiveQuery(sources=("s2",)))) == ["http://b:1"]
+    assert urls(index.query(CUTOFF, LiveQuery(protocol=Protocol.SOCKS5))) == ["socks5://c:1"]
+    assert urls(index.query(CUTOFF, LiveQuery(max_latency_ms=200))) == ["http://a:1"]
+    assert urls(index.query(CUTOFF, LiveQuery(limit=2))) == ["http://a:1", "http://b:1"]
+
+
+def test_query_sort_by_latency_unknown_last(live_proxy):
+    index = LiveIndex()
+    index.rebuild([live_proxy("http://a:1"), live_proxy("http://b:1", latency_ms=300), live_proxy("http://c:1", latency_ms=50)])
+    assert urls(index.query(CUTOFF, LiveQuery(sort=LiveSort.LATENCY))) == ["http://c:1", "http://b:1", "http://a:1"]
+
+
+def test_query_unique_ip(live_proxy):
+    index = LiveIndex()
+    index.rebuild(
+        [
+            live_proxy("http://a:1", proxy_ip="1.1.1.1", latency_ms=300),
+            live_proxy("http://b:1", proxy_ip="1.1.1.1", latency_ms=100),
+            live_proxy("http://c:1"),
+            live_proxy("http://d:1", proxy_ip="2.2.2.2"),
+        ]
+    )
+    # the first proxy per ip in the url order, proxies without an ip go last
+    assert urls(index.query(CUTOFF, LiveQuery(unique_ip=True))) == ["http://a:1", "http://d:1", "http://c:1"]
+    # with sort=latency the fastest proxy of an ip is kept
+    q = LiveQuery(unique_ip=True, sort=LiveSort.LATENCY)
+    assert urls(index.query(CUTOFF, q)) == ["http://b:1", "http://d:1", "http://c:1"]
+
+
+def test_upsert_moves_between_groups_and_publishes(live_proxy):
+    index = LiveIndex()
+    index.upsert(live_proxy("http://a:1"))
+    index.upsert(live_proxy("http://a:1", source="s2"))
+    assert len(index) == 1
+    assert urls(index.query(CUTOFF, LiveQuery(sources=("s1",)))) == []
+    assert urls(index.query(CUTOFF, LiveQuery(sources=("s2",)))) == ["http://a:1"]
+    events = [e.type for e in index.feed.since(0) or []]
+    assert events == [LiveEventType.ADDED, LiveEventType.REMOVED, LiveEventType.ADDED]
+
+
+def test_upsert_known_proxy_bumps_data_version(live_proxy):
+    index = LiveIndex()
+    index.upsert(live_proxy("http://a:1", latency_ms=100))
+    seq, data_version = index.version
+    index.upsert(live_proxy("http://a:1", latency_ms=200))
+    assert index.version == (seq, data_version + 1)
+    assert index.query(CUTOFF, LiveQuery())[0].latency_ms == 200
+
+
+def test_discard_and_expire(live_proxy):
+    index = LiveIndex()
+    index.rebuild([live_proxy("http://a:1"), live_proxy("http://b:1", age_minutes=10)])
+    assert index.expire(CUTOFF) == 1
+    assert index.discard("http://a:1")
+    assert not index.discard("http://a:1")
+    assert len(index) == 0
+    assert index.groups() == []
@@ -0,0 +1,73 @@
+import pytest
+
+from app.core import metrics
+from app.core.metrics import Histogram, Metrics, RateCounter, escape_label, merge_snapshots, render_prometheus
+
+
+@pytest.fixture(autouse=True)
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(metrics, "time", clock)
+    return clock
+
+
+def test_rate_counter_windows(clock):
+    counter = RateCounter(window_seconds=60)
+    counter.add()
+    clock.now += 10
+    counter.add(3)
+    assert counter.count(5) == 3
+    assert counter.count(11) == 4
+    assert counter.count(60) == 4
+    assert counter.count(3600) == 4  # capped by the window
+
+
+def test_rate_counter_forgets_old_buckets(clock):
+    counter = RateCounter(window_seconds=60)
+    counter.add(5)
+    clock.now += 59
+    assert counter.count(60) == 5
+    clock.now += 1
+    assert counter.count(60) == 0
+    counter.add()  # reuses the slot of the first bucket
+    assert counter.count(60) == 1
+
+
+def test_rate_counter_buckets(clock):
+    counter = RateCounter(window_seconds=3600, bucket_seconds=60)
+    counter.add()
+    clock.now += 60
+    counter.add()
+    assert counter.count(60) == 1
+    assert counter.count(120) == 2
+
+
+def test_histogram_bounds():
+    h = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        h.observe(value)
+    assert h.snapshot() == {"counts": [2, 1, 1], "sum": 2.65}
+
+
+def test_merge_and_render():
+    a, b = Metrics(), Metrics()
+    a.record_check("src", "http", "ok", 0.2)
+    b.record_check("src", "http", "down", 3.0)
+    merged = merge_snapshots([a.snapshot(), b.snapshot()])
+    assert merged["sources"] == {"src": {"ok": 1, "all": 2, "all_5m": 2}}
+    assert merged["checks"] == {"60": 0, "300": 0, "3600": 0}  # the check pool counts checks, not record_check
+    text = render_prometheus(merged, {"live_proxies": 7})
+    assert 'mm_proxy_source_success_ratio{source="src"} 0.5000' in text
+    assert 'mm_proxy_check_duration_seconds_count{outcome="ok",protocol="http"} 1' in text
+    assert "mm_proxy_live_proxies 7" in text
+
+
+def test_escape_label():
+    assert escape_label("plain") == "plain"
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+def test_render_escapes_source_names():
+    metrics = Metrics()
+    metrics.record_check('evil"}\n', "http", "ok", 0.1)
+    text = render_prometheus(metrics.snapshot(), {})
+    assert 'mm_proxy_source_success_ratio{source="evil\\"}\\n"} 1.0000' in text
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.db import CheckHistory, Proxy, Status
+from app.core.services import proxy as proxy_service
+from app.core.services.proxy import ProxyService
+from tests.conftest import NOW
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(proxy_service, "utc_now", lambda: NOW)
+    service = ProxyService()
+    settings = SimpleNamespace(
+        live_last_ok_minutes=15, proxy_recheck_lead_seconds=60, proxy_backoff_base_seconds=60, proxy_backoff_max_minutes=60
+    )
+    service.core = SimpleNamespace(settings=settings)
+    return service
+
+
+def checked(status: Status, history: list[bool], last_ok_at=None) -> Proxy:
+    proxy = Proxy.new("s1", "http://1.2.3.4:8080")
+    return proxy.model_copy(update={"status": status, "history": CheckHistory.from_list(history), "last_ok_at": last_ok_at})
+
+
+def test_ok_is_rechecked_before_leaving_the_live_window(service):
+    last_ok_at = NOW - timedelta(minutes=2)
+    proxy = checked(Status.OK, [True], last_ok_at)
+    assert service.calc_next_check_at(proxy) == last_ok_at + timedelta(minutes=14)  # 15 minutes, less the 60 second lead
+
+
+def test_recheck_lead_is_capped(service):
+    service.core.settings.proxy_recheck_lead_seconds = 10_000  # longer than the live window
+    proxy = checked(Status.OK, [True], NOW)
+    assert service.calc_next_check_at(proxy) == NOW + timedelta(seconds=30)
+
+
+@pytest.mark.parametrize(
+    ("history", "backoff"),
+    [
+        ([], timedelta(minutes=1)),  # never checked ok, no history yet
+        ([False], timedelta(minutes=1)),
+        ([False, False], timedelta(minutes=2)),
+        ([False, False, False, True, False], timedelta(minutes=4)),  # only the newest downs in a row count
+        ([False] * 6, timedelta(minutes=32)),
+        ([False] * 7, timedelta(minutes=60)),  # capped by proxy_backoff_max_minutes
+        ([False] * 100, timedelta(minutes=60)),
+    ],
+)
+def test_down_backs_off_exponentially(service, history, backoff):
+    proxy = checked(Status.DOWN, history, NOW - timedelta(days=1))
+    assert service.calc_next_check_at(proxy) == NOW + backoff
+
+
+def test_ok_without_last_ok_at_backs_off(service):
+    assert service.calc_next_check_at(checked(Status.OK, [True])) == NOW + timedelta(minutes=1)
@@ -0,0 +1,26 @@
+from app.core.services.source import ParsedEndpoint, parse_proxy_endpoint, parse_proxy_endpoints
+
+
+def test_parse_proxy_endpoint():
+    assert parse_proxy_endpoint("socks5://u:p@1.2.3.4:1080") == ParsedEndpoint(url="socks5://u:p@1.2.3.4:1080")
+    assert parse_proxy_endpoint("  http://proxy.example:8080\r") == ParsedEndpoint(url="http://proxy.example:8080")
+    assert parse_proxy_endpoint("1.2.3.4:8080") == ParsedEndpoint(ip="1.2.3.4", port=8080)
+    assert parse_proxy_endpoint("1.2.3.4") == ParsedEndpoint(ip="1.2.3.4")
+
+
+def test_parse_proxy_endpoint_rejects_garbage():
+    assert parse_proxy_endpoint("") is None
+    assert parse_proxy_endpoint("# comment") is None
+    assert parse_proxy_endpoint("ftp://1.2.3.4:21") is None
+    assert parse_proxy_endpoint("proxy.example:8080") is None
+    assert parse_proxy_endpoint("1.2.3.4:port") is None
+
+
+def test_parse_proxy_endpoints():
+    data = "1.2.3.4:8080\n\nnot a proxy\r\nsocks5://5.6.7.8:1080\n9.9.9.9\n"
+    assert parse_proxy_endpoints(data) == [
+        ParsedEndpoint(ip="1.2.3.4", port=8080),
+        ParsedEndpoint(url="socks5://5.6.7.8:1080"),
+        ParsedEndpoint(ip="9.9.9.9"),
+    ]
+    assert parse_proxy_endpoints("") == []
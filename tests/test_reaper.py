@@ -0,0 +1,146 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+from app.core.services import proxy as proxy_service
+from app.core.services.proxy import ProxyService
+from tests.conftest import NOW
+
+
+def matches(doc: dict, query: dict) -> bool:
+    """The few query operators the reaper uses."""
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if not isinstance(cond, dict):
+            if value != cond:
+                return False
+            continue
+        for op, arg in cond.items():
+            ok = {
+                "$lte": lambda v, a: v is not None and v <= a,
+                "$in": lambda v, a: v in a,
+                "$nin": lambda v, a: v not in a,
+            }[op](value, arg)
+            if not ok:
+                return False
+    return True
+
+
+class Cursor:
+    def __init__(self, docs: list[dict], projection: dict) -> None:
+        self.docs = docs
+        self.projection = projection
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self):
+        return [{k: d[k] for k in ("_id", *self.projection)} for d in self.docs]
+
+
+class FakeProxies:
+    def __init__(self, docs: list[dict]) -> None:
+        self.docs = {d["_id"]: d for d in docs}
+        self.batches: list[int] = []  # sizes of the found batches
+        self.before_delete = lambda: None  # a check result landing between the find and the delete
+
+    def find(self, query, projection):
+        return Cursor([d for d in self.docs.values() if matches(d, query)], projection)
+
+    async def delete_many(self, query):
+        self.before_delete()
+        ids = [id for id, d in self.docs.items() if matches(d, query)]
+        for id in ids:
+            del self.docs[id]
+        self.batches.append(len(query["_id"]["$in"]))
+        return SimpleNamespace(deleted_count=len(ids))
+
+
+class FakeTombstones:
+    def __init__(self) -> None:
+        self.writes = 0  # upserted tombstones
+
+    async def bulk_write(self, ops, ordered):
+        assert not ordered
+        self.writes += len(ops)
+
+
+def doc(n: int, expires_in: timedelta, **fields) -> dict:
+    return {"_id": ObjectId(), "url": f"http://10.0.0.{n}:8080", "expires_at": NOW + expires_in, "lease_until": None} | fields
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.setattr(proxy_service, "utc_now", lambda: NOW)
+
+    def make(docs: list[dict], batch_size: int = 2, unwritten: set[ObjectId] = frozenset()):
+        service = ProxyService()
+        proxies, tombstones = FakeProxies(docs), FakeTombstones()
+        db = SimpleNamespace(proxy=SimpleNamespace(collection=proxies), proxy_tombstone=SimpleNamespace(collection=tombstones))
+        service.core = SimpleNamespace(db=db, settings=SimpleNamespace(proxy_reap_batch_size=batch_size))
+        service.writer = SimpleNamespace(pending_ids=lambda: set(unwritten))
+        return service, proxies, tombstones
+
+    return make
+
+
+def test_deletes_in_batches(make_service):
+    expired = [doc(i, timedelta(minutes=-i)) for i in range(1, 6)]
+    fresh = [doc(i, timedelta(minutes=i)) for i in range(6, 8)]
+    service, proxies, tombstones = make_service(expired + fresh)
+    assert asyncio.run(service.reap_expired_proxies()) == 5
+    assert proxies.batches == [2, 2, 1]
+    assert set(proxies.docs) == {d["_id"] for d in fresh}
+    assert list(service.tombstones.tombstones) == [d["url"] for d in reversed(expired)]  # the longest expired first
+    assert tombstones.writes == 5
+    stats = service.reaper_stats
+    assert (stats.runs, stats.deleted_total, stats.last_deleted, stats.last_run_at) == (1, 5, 5, NOW)
+
+
+def test_full_last_batch(make_service):
+    service, proxies, _ = make_service([doc(i, timedelta(minutes=-1)) for i in range(4)])
+    assert asyncio.run(service.reap_expired_proxies()) == 4
+    assert proxies.batches == [2, 2]  # the next find is empty
+
+
+def test_skips_unwritten_and_leased(make_service):
+    unwritten = doc(1, timedelta(minutes=-1))  # a buffered check result may move its expires_at
+    leased = doc(2, timedelta(minutes=-1), lease_until=NOW + timedelta(seconds=30))  # being checked right now
+    lease_expired = doc(3, timedelta(minutes=-1), lease_until=NOW - timedelta(seconds=1))
+    service, proxies, tombstones = make_service([unwritten, leased, lease_expired], unwritten={unwritten["_id"]})
+    assert asyncio.run(service.reap_expired_proxies()) == 1
+    assert set(proxies.docs) == {unwritten["_id"], leased["_id"]}
+    assert list(service.tombstones.tombstones) == [lease_expired["url"]]
+    assert tombstones.writes == 1
+
+
+def test_checked_between_find_and_delete(make_service):
+    rescued, dead = doc(1, timedelta(minutes=-2)), doc(2, timedelta(minutes=-1))
+    service, proxies, _ = make_service([rescued, dead])
+
+    def check_ok():
+        rescued["expires_at"] = NOW + timedelta(days=1)
+
+    proxies.before_delete = check_ok
+    assert asyncio.run(service.reap_expired_proxies()) == 1
+    assert set(proxies.docs) == {rescued["_id"]}
+    assert list(service.tombstones.tombstones) == [dead["url"]]  # the rescued one is not buried
+
+
+def test_checker_processes_do_not_reap(make_service):
+    service, proxies, _ = make_service([doc(1, timedelta(minutes=-1))])
+    service.partition = (0, 2)
+    assert asyncio.run(service.reap_expired_proxies()) == 0
+    assert len(proxies.docs) == 1
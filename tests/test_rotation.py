@@ -0,0 +1,84 @@
+import random
+from collections import Counter
+
+from app.core import rotation
+from app.core.live import LiveIndex
+from app.core.rotation import RotationStrategy, Rotator
+from tests.conftest import CUTOFF
+
+
+def rotator(*proxies):
+    live = LiveIndex()
+    live.rebuild(proxies)
+    return Rotator(live)
+
+
+def next_urls(r, strategy, **kwargs):
+    return [p.url for p in r.next(CUTOFF, strategy, **kwargs)]
+
+
+def test_empty():
+    assert rotator().next(CUTOFF, RotationStrategy.ROUND_ROBIN) == []
+
+
+def test_round_robin_cycles(live_proxy):
+    r = rotator(live_proxy("http://a:1"), live_proxy("http://b:1"), live_proxy("http://c:1", source="s2"))
+    picks = [next_urls(r, RotationStrategy.ROUND_ROBIN)[0] for _ in range(6)]
+    assert sorted(picks[:3]) == ["http://a:1", "http://b:1", "http://c:1"]
+    assert picks[3:] == picks[:3]
+
+
+def test_round_robin_count_skips_stale(live_proxy):
+    r = rotator(live_proxy("http://a:1"), live_proxy("http://b:1", age_minutes=10), live_proxy("http://c:1"))
+    assert sorted(next_urls(r, RotationStrategy.ROUND_ROBIN, count=3)) == ["http://a:1", "http://c:1"]
+
+
+def test_round_robin_cursor_per_filter(live_proxy):
+    r = rotator(live_proxy("http://a:1"), live_proxy("http://b:1", source="s2"))
+    first = next_urls(r, RotationStrategy.ROUND_ROBIN, sources=("s1",))
+    assert first == ["http://a:1"]
+    assert next_urls(r, RotationStrategy.ROUND_ROBIN, sources=("s1",)) == first
+    assert r.cursors[(("s1",), None)] == 2
+
+
+def test_round_robin_cursors_are_bounded(monkeypatch, live_proxy):
+    monkeypatch.setattr(rotation, "MAX_CURSORS", 2)
+    r = rotator(live_proxy("http://a:1"))
+    for source in ("x", "s1", "y", "s1", "z"):
+        next_urls(r, RotationStrategy.ROUND_ROBIN, sources=(source, "s1"))
+    assert list(r.cursors) == [(("s1", "s1"), None), (("z", "s1"), None)]
+
+
+def test_unique_ip(live_proxy):
+    r = rotator(
+        live_proxy("http://a:1", proxy_ip="1.1.1.1"), live_proxy("http://b:1", proxy_ip="1.1.1.1"), live_proxy("http://c:1")
+    )
+    res = next_urls(r, RotationStrategy.ROUND_ROBIN, count=3, unique_ip=True)
+    assert len(res) == 2
+    assert "http://c:1" in res
+
+
+def test_sticky_is_stable(live_proxy):
+    proxies = [live_proxy(f"http://{i}:1", source=f"s{i % 3}") for i in range(20)]
+    r = rotator(*proxies)
+    for key in ("alice", "bob", "carol"):
+        first = next_urls(r, RotationStrategy.STICKY, key=key, count=3)
+        assert len(first) == 3
+        assert next_urls(r, RotationStrategy.STICKY, key=key, count=3) == first
+
+
+def test_sticky_survives_unrelated_removals(live_proxy):
+    proxies = [live_proxy(f"http://{i}:1") for i in range(20)]
+    r = rotator(*proxies)
+    picked = next_urls(r, RotationStrategy.STICKY, key="alice")[0]
+    for p in proxies:
+        if p.url != picked:
+            r.live.discard(p.url)
+            assert next_urls(r, RotationStrategy.STICKY, key="alice") == [picked]
+
+
+def test_weighted_prefers_successful(monkeypatch, live_proxy):
+    monkeypatch.setattr(rotation, "random", random.Random(1))
+    r = rotator(live_proxy("http://good:1", success_rate=1.0), live_proxy("http://bad:1", success_rate=0.1))
+    picks = Counter(next_urls(r, RotationStrategy.WEIGHTED)[0] for _ in range(1000))
+    assert picks["http://good:1"] > picks["http://bad:1"] * 5
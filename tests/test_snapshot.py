@@ -0,0 +1,82 @@
+import gzip
+from compression import zstd
+
+from app.core.live import LiveQuery, LiveSort
+from app.core.snapshot import LiveSnapshot, LiveSnapshotCache, choose_encoding, depends_on_data
+
+URLS = ["http://1.1.1.1:80", "http://2.2.2.2:80"]
+
+
+class Build:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self) -> list[str]:
+        self.calls += 1
+        return URLS
+
+
+def test_reused_until_membership_changes():
+    cache, build = LiveSnapshotCache(), Build()
+    first = cache.get(LiveQuery(), "json", (1, 1), build)
+    assert first.body == b'{"proxies":["http://1.1.1.1:80","http://2.2.2.2:80"]}'
+    assert cache.get(LiveQuery(), "json", (1, 5), build) is first  # proxy data is not in the body
+    assert build.calls == 1
+    assert cache.get(LiveQuery(), "json", (2, 5), build) is not first
+    assert build.calls == 2
+    assert cache.get(LiveQuery(), "text", (2, 5), build).body == b"http://1.1.1.1:80\nhttp://2.2.2.2:80"
+
+
+def test_data_dependent_queries():
+    assert not depends_on_data(LiveQuery(sources=("s1",), limit=10))
+    assert depends_on_data(LiveQuery(sort=LiveSort.LATENCY))
+    assert depends_on_data(LiveQuery(unique_ip=True))
+    assert depends_on_data(LiveQuery(max_latency_ms=500))
+
+    cache, build = LiveSnapshotCache(), Build()
+    q = LiveQuery(sort=LiveSort.LATENCY)
+    first = cache.get(q, "json", (1, 1), build)
+    assert cache.get(q, "json", (1, 1), build) is first
+    assert cache.get(q, "json", (1, 2), build) is not first
+    assert build.calls == 2
+
+
+def test_lru_bound():
+    cache, build = LiveSnapshotCache(max_entries=2), Build()
+    a, b, c = LiveQuery(sources=("a",)), LiveQuery(sources=("b",)), LiveQuery(sources=("c",))
+    cache.get(a, "json", (1, 0), build)
+    cache.get(b, "json", (1, 0), build)
+    cache.get(a, "json", (1, 0), build)  # b is the least recently used now
+    cache.get(c, "json", (1, 0), build)
+    assert list(cache.entries) == [(a, "json"), (c, "json")]
+
+
+def test_choose_encoding():
+    assert choose_encoding("") is None
+    assert choose_encoding("br, deflate") is None
+    assert choose_encoding("gzip, deflate, br") == "gzip"
+    assert choose_encoding("GZIP;q=0.5, zstd") == "zstd"
+
+
+def test_encodings_and_etags():
+    snapshot = LiveSnapshot((1, 0), b"x" * 1000, "text/plain")
+    assert snapshot.encode(None) == snapshot.body
+    assert gzip.decompress(snapshot.encode("gzip")) == snapshot.body
+    assert zstd.decompress(snapshot.encode("zstd")) == snapshot.body
+    assert snapshot.encode("gzip") is snapshot.encode("gzip")  # compressed once
+    etags = {snapshot.etag(e) for e in (None, "gzip", "zstd")}
+    assert len(etags) == 3
+    assert all(e.startswith('"') and e.endswith('"') for e in etags)
+    # the same content gets the same tags, in another process too
+    assert LiveSnapshot((9, 9), b"x" * 1000, "text/plain").etag("gzip") == snapshot.etag("gzip")
+
+
+def test_not_modified():
+    snapshot = LiveSnapshot((1, 0), b"body", "text/plain")
+    gzip_etag = snapshot.etag("gzip")
+    assert not snapshot.not_modified(None, "gzip")
+    assert snapshot.not_modified(gzip_etag, "gzip")
+    assert snapshot.not_modified(f'"other", W/{gzip_etag}', "gzip")
+    assert not snapshot.not_modified(gzip_etag, None)  # a client that stopped accepting gzip needs the plain body
+    assert not snapshot.not_modified(gzip_etag, "zstd")
+    assert snapshot.not_modified("*", None)
@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from app.core.db import Protocol, Source
+from app.core.live import LiveIndex
+from app.core.services.source import SourceService
+from app.core.tombstone import TombstoneStore
+
+DEFAULT = Source.Default(protocol=Protocol.HTTP, username="u", password="p", port=8080)
+
+
+class FakeSources:
+    def __init__(self, source: Source) -> None:
+        self.sources = {source.id: source}
+
+    async def get(self, id):
+        return self.sources[id]
+
+    async def set(self, id, updated):
+        self.sources[id] = self.sources[id].model_copy(update=updated)
+
+
+class FakeProxies:
+    """Stored proxies as url -> source, with the few collection methods the ingestion uses."""
+
+    def __init__(self, stored: dict[str, str]) -> None:
+        self.stored = dict(stored)
+        self.collection = self
+
+    async def find(self, query, _projection):
+        for url, source in list(self.stored.items()):
+            if source == query["source"]:
+                yield {"url": url}
+
+    async def insert_many(self, proxies, ordered):
+        assert not ordered
+        errors = []
+        for i, proxy in enumerate(proxies):
+            if proxy.url in self.stored:
+                errors.append({"index": i, "code": 11000})
+            else:
+                self.stored[proxy.url] = proxy.source
+        if errors:
+            raise BulkWriteError({"nInserted": len(proxies) - len(errors), "writeErrors": errors})
+
+    async def delete_many(self, query):
+        urls = [u for u in query["url"]["$in"] if self.stored.get(u) == query["source"]]
+        for url in urls:
+            del self.stored[url]
+        return SimpleNamespace(deleted_count=len(urls))
+
+
+def make_service(source: Source, stored: dict[str, str]):
+    tombstones = TombstoneStore()
+    proxy_service = SimpleNamespace(tombstones=tombstones, live=LiveIndex())
+    db = SimpleNamespace(source=FakeSources(source), proxy=FakeProxies(stored))
+    service = SourceService()
+    service.core = SimpleNamespace(db=db, services=SimpleNamespace(proxy=proxy_service))
+    return service, db
+
+
+@pytest.fixture
+def link(httpserver):
+    def serve(body: str) -> str:
+        httpserver.clear()
+        httpserver.expect_request("/list").respond_with_data(body)
+        return httpserver.url_for("/list")
+
+    return serve
+
+
+def test_diff_counts(link):
+    source = Source(id="s1", default=DEFAULT, link=link(""))
+    stored = {
+        "http://u:p@1.1.1.1:80": "s1",  # still listed
+        "http://u:p@9.9.9.9:8080": "s1",  # dropped from the list
+        "socks5://3.3.3.3:1080": "s2",  # listed, but another source has it
+    }
+    service, db = make_service(source, stored)
+    service.core.services.proxy.tombstones.bury("http://u:p@4.4.4.4:8080")
+    body = "1.1.1.1:80\n1.1.1.1:80\nnot a proxy\n2.2.2.2\nsocks5://3.3.3.3:1080\n4.4.4.4\n\n"
+    db.source.sources["s1"] = source.model_copy(update={"link": link(body)})
+
+    report = asyncio.run(service.check("s1"))
+
+    assert report.added == 1
+    assert report.unchanged == 1
+    assert report.duplicate == 2  # the repeated line and the url of s2
+    assert report.invalid == 1
+    assert report.tombstoned == 1
+    assert report.removed == 1
+    assert report.retire_skipped == 0
+    assert db.proxy.stored == {
+        "http://u:p@1.1.1.1:80": "s1",
+        "http://u:p@2.2.2.2:8080": "s1",
+        "socks5://3.3.3.3:1080": "s2",
+    }
+    assert db.source.sources["s1"].content_hash is not None
+    assert db.source.sources["s1"].full_ingest_at is not None
+
+
+def test_unchanged_content_is_not_diffed(link):
+    source = Source(id="s1", default=DEFAULT, link=link("1.1.1.1:80\n"))
+    service, db = make_service(source, {})
+    assert asyncio.run(service.check("s1")).added == 1
+    db.proxy.stored.clear()  # deleted with a tombstone in real life, it can't come back yet anyway
+    report = asyncio.run(service.check("s1"))
+    assert report.not_modified
+    assert db.proxy.stored == {}
+
+
+@pytest.mark.parametrize("body", ["", "\n\n", "<html>\n<body>\nService Unavailable\n</body>\n</html>\n1.1.1.1:80\n"])
+def test_broken_list_does_not_retire(link, body):
+    source = Source(id="s1", default=DEFAULT, link=link(body))
+    stored = {f"http://u:p@10.0.0.{i}:8080": "s1" for i in range(5)}
+    service, db = make_service(source, stored)
+    report = asyncio.run(service.check("s1"))
+    assert report.removed == 0
+    assert report.retire_skipped == 5
+    assert all(url in db.proxy.stored for url in stored)
+
+
+def test_items():
+    source = Source(id="s1", default=DEFAULT, items=["5.5.5.5", "http://6.6.6.6:3128", "5.5.5.5"])
+    service, db = make_service(source, {"http://u:p@7.7.7.7:8080": "s1"})
+    report = asyncio.run(service.check("s1"))
+    assert (report.added, report.removed, report.duplicate) == (2, 1, 1)
+    assert set(db.proxy.stored) == {"http://u:p@5.5.5.5:8080", "http://6.6.6.6:3128"}
@@ -0,0 +1,47 @@
+from datetime import UTC, datetime, timedelta
+
+import pytest
+
+from app.core import tombstone
+from app.core.tombstone import TombstoneStore
+
+URL = "http://1.2.3.4:8080"
+
+
+@pytest.fixture
+def now(monkeypatch):
+    now = [datetime(2025, 1, 1, tzinfo=UTC)]
+    monkeypatch.setattr(tombstone, "utc_now", lambda: now[0])
+    return now
+
+
+def test_strikes_double_the_block(now):
+    store = TombstoneStore(base_hours=6, max_hours=48)
+    hours = []
+    for _ in range(5):
+        t = store.bury(URL)
+        hours.append((t.blocked_until - now[0]) / timedelta(hours=1))
+        assert t.expires_at == t.blocked_until + TombstoneStore.STRIKES_MEMORY
+        now[0] = t.blocked_until  # buried again right after the block ends
+    assert hours == [6, 12, 24, 48, 48]
+    assert store.tombstones[URL].strikes == 5
+    assert len(store) == 1
+
+
+def test_strikes_reset_after_expiry(now):
+    store = TombstoneStore(base_hours=6)
+    store.bury(URL)
+    store.bury(URL)
+    now[0] = store.tombstones[URL].expires_at
+    assert store.bury(URL).strikes == 1
+
+
+@pytest.mark.usefixtures("now")
+def test_is_blocked():
+    store = TombstoneStore(base_hours=6)
+    assert not store.is_blocked(URL)
+    t = store.bury(URL)
+    assert store.is_blocked(URL)
+    assert store.is_blocked(URL, now=t.blocked_until - timedelta(seconds=1))
+    assert not store.is_blocked(URL, now=t.blocked_until)
+    assert not store.is_blocked("http://5.6.7.8:8080")